@@ -11,14 +11,16 @@ import wave
 import math
 import subprocess
 import tempfile
+import shutil
 import secrets
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional, Any, Dict, Tuple, List
 
 import numpy as np
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g
 
 # ==================================================
 # Config
@@ -39,7 +41,26 @@ openai_client = None
 try:
     if OPENAI_API_KEY:
         from openai import OpenAI
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
+
+        # HTTPクライアントはモジュールで1つだけ作って全ワーカースレッドで共有する。
+        # 接続プール＋keep-alive（可能なら HTTP/2）で、/api/comment のたびに
+        # TLS ハンドシェイクをやり直さずに済む。
+        _openai_http_client = None
+        try:
+            import httpx
+            _openai_http_client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+        except Exception:
+            # httpx / h2 が無い環境では SDK 既定のクライアントに任せる
+            _openai_http_client = None
+
+        if _openai_http_client is not None:
+            openai_client = OpenAI(api_key=OPENAI_API_KEY, http_client=_openai_http_client)
+        else:
+            openai_client = OpenAI(api_key=OPENAI_API_KEY)
 except Exception:
     openai_client = None
 
@@ -151,6 +172,28 @@ def read_json_or_error(path: Path, label: str) -> Any:
         raise ValueError(f"{label} invalid json: {path} ({e})")
 
 
+# (mtime_ns, size) が一致する間はパース済みJSONを使い回す。
+# 解析結果ファイルは書き換わらないので、同一セッションの再取得でパースが丸ごと飛ぶ。
+_parsed_json_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+
+def _stat_sig(path: Path) -> Tuple[int, int]:
+    st = path.stat()
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_json_cached(path: Path, label: str) -> Any:
+    if not path.exists():
+        raise FileNotFoundError(f"{label} not found: {path}")
+    sig = _stat_sig(path)
+    hit = _parsed_json_cache.get(str(path))
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    obj = read_json_or_error(path, label)
+    _parsed_json_cache[str(path)] = (sig, obj)
+    return obj
+
+
 @app.get("/api/admin/paths")
 def admin_paths():
     return jsonify({
@@ -187,7 +230,7 @@ def _load_song_catalog_from_server() -> Dict[str, SongItem]:
     if not SERVER_SONGS_JSON.exists():
         raise FileNotFoundError(f"songs.json not found on server: {SERVER_SONGS_JSON}")
 
-    raw = read_json_or_error(SERVER_SONGS_JSON, "songs.json")
+    raw = read_json_cached(SERVER_SONGS_JSON, "songs.json")
     songs = raw.get("songs") if isinstance(raw, dict) else None
     if not isinstance(songs, list):
         raise ValueError(f"songs.json format invalid (songs is not list): {SERVER_SONGS_JSON}")
@@ -269,6 +312,17 @@ def make_take_id() -> str:
     return datetime.now().strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
 
 
+def make_history_id() -> str:
+    """
+    時刻順に増える履歴ID（ULID相当の自前実装）。
+
+    先頭にミリ秒タイムスタンプ(hex 12桁)、後ろに乱数(hex 20桁)。
+    uuid4 と違い挿入順とID順がほぼ一致するので、PRIMARY KEY の
+    B-tree 挿入が常に右端ページ追記になり、ランダムなページ分割が起きない。
+    """
+    return f"{int(time.time() * 1000):012x}{secrets.token_hex(10)}"
+
+
 def get_session_dir(song_id: str, user_id: str, take_id: Optional[str] = None) -> Path:
     base = (SESSIONS_DIR / song_id / user_id).resolve()
     base.mkdir(parents=True, exist_ok=True)
@@ -331,6 +385,10 @@ def close_db(_err):
         db.close()
 
 
+# スキーマを変えたら +1 する。init_db は user_version が一致したら何もしない。
+SCHEMA_VERSION = 1
+
+
 def init_db():
     """
     gunicorn 起動（__main__ じゃない）でも必ず実行されるように、
@@ -339,6 +397,9 @@ def init_db():
     ここで作るテーブル:
     - history: 解析結果/コメント/スコア等の履歴
     - users  : user_id + token_hash を管理（端末なしでも user 発行できるようにする）
+
+    CREATE TABLE / CREATE INDEX は冪等だが毎回のSQL往復と排他ロックが無駄なので、
+    PRAGMA user_version でスキーマ版を見て、最新なら即 return する。
     """
     _ensure_db_parent_dir()
     db = sqlite3.connect(
@@ -350,6 +411,11 @@ def init_db():
     db.execute("PRAGMA synchronous=NORMAL;")
     db.execute("PRAGMA busy_timeout=5000;")
 
+    current_version = db.execute("PRAGMA user_version").fetchone()[0]
+    if current_version == SCHEMA_VERSION:
+        db.close()
+        return
+
     # ------------------------------
     # history
     # ------------------------------
@@ -402,6 +468,7 @@ def init_db():
     db.execute("CREATE INDEX IF NOT EXISTS idx_users_token_hash ON users(token_hash)")
     db.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)")
 
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     db.commit()
     db.close()
 
@@ -409,6 +476,52 @@ def init_db():
 # ==================================================
 # OpenAI helpers
 # ==================================================
+# システムプロンプトは毎回組み立てず、モジュールで1回だけ作る
+AI_COMMENT_SYSTEM_PROMPT = """
+あなたはカラオケ初心者向けの歌のコーチです。専門用語は使いません。
+
+出力は必ずJSONのみ：
+{"title": string, "body": string}
+
+ルール：
+- 日本語・短文・絵文字なし
+- bodyは4〜6行まで
+- cents/Hz/MIDI/オクターブ等の用語は禁止（「高い/低い」「1段上/下」に言い換え）
+- 数字は基本1つまで（秒も出さない）
+- 必ず「今日やる練習」を2つ書く（すぐできる内容）
+- 最後に一言だけ励ます
+""".strip()
+
+# 同一入力（同じ song/take/統計）の再問い合わせはLLMを呼ばずにキャッシュで返す。
+# iOS 側のリトライで同じペイロードが来るケースのネットワーク往復を丸ごと省く。
+AI_COMMENT_CACHE_TTL_SEC = float(os.getenv("AI_COMMENT_CACHE_TTL_SEC", "86400"))
+AI_COMMENT_CACHE_MAX = 1000
+_ai_comment_cache: Dict[str, Tuple[float, str, str]] = {}
+
+
+def _ai_comment_cache_key(model_input: Dict[str, Any]) -> str:
+    return _sha256(json.dumps(model_input, ensure_ascii=False, sort_keys=True))
+
+
+def _ai_comment_cache_get(key: str) -> Optional[Tuple[str, str]]:
+    hit = _ai_comment_cache.get(key)
+    if hit is None:
+        return None
+    expires_at, title, body = hit
+    if expires_at < time.time():
+        _ai_comment_cache.pop(key, None)
+        return None
+    return title, body
+
+
+def _ai_comment_cache_put(key: str, title: str, body: str) -> None:
+    if len(_ai_comment_cache) >= AI_COMMENT_CACHE_MAX:
+        # 期限の近いものから半分ほど捨てる（厳密なLRUまでは不要）
+        for k in sorted(_ai_comment_cache, key=lambda k: _ai_comment_cache[k][0])[: AI_COMMENT_CACHE_MAX // 2]:
+            _ai_comment_cache.pop(k, None)
+    _ai_comment_cache[key] = (time.time() + AI_COMMENT_CACHE_TTL_SEC, title, body)
+
+
 def require_openai_key_or_error():
     if openai_client is None:
         raise RuntimeError("OPENAI_API_KEY is not set or OpenAI client failed to initialize.")
@@ -726,7 +839,10 @@ def upload_voice(user_id: str):
         sess_dir = get_session_dir(song_id, user_id, take_id)
         wav_path = sess_dir / "input.wav"
 
-        up.save(wav_path)
+        # up.save() は小さなチャンクでコピーするため大きな録音で遅い。
+        # 1MiB バッファの copyfileobj でストリームから直接書き出す。
+        with wav_path.open("wb") as dst:
+            shutil.copyfileobj(up.stream, dst, length=1 << 20)
 
         analysis = analyze_fft(song_id, user_id, take_id, wav_path)
 
@@ -764,20 +880,24 @@ def get_analysis(session_id: str):
         events_path = sess_dir / "events.json"
         summary_path = sess_dir / "summary.json"
 
-        ref_pitch = read_json_or_error(ref_pitch_path, "ref_pitch")
-        usr_pitch = read_json_or_error(usr_pitch_path, "usr_pitch")
-        events = read_json_or_error(events_path, "events")
-        summary = read_json_or_error(summary_path, "summary")
-
-        return jsonify({
+        # 4ファイルの (mtime_ns, size) からETagを作る。ファイルが変わらない限り
+        # If-None-Match 一致で 304 を返し、本文生成もJSONパースもスキップする。
+        paths = (ref_pitch_path, usr_pitch_path, events_path, summary_path)
+        for p, label in zip(paths, ("ref_pitch", "usr_pitch", "events", "summary")):
+            if not p.exists():
+                raise FileNotFoundError(f"{label} not found: {p}")
+        etag = '"' + "-".join(f"{m}-{s}" for m, s in (_stat_sig(p) for p in paths)) + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return "", 304
+
+        # ディスク上の4ファイルは既にJSONなので、パース→再シリアライズせずに
+        # バイト列のままエンベロープへ継ぎ足す。巨大なpitchトラックでも
+        # Pythonオブジェクト化のCPU・メモリコストがゼロになる。
+        head = json.dumps({
             "ok": True,
             "session_id": session_id,
             "song_id": song_id,
             "user_id": user_id,
-            "events": events,
-            "ref_pitch": ref_pitch,
-            "usr_pitch": usr_pitch,
-            "summary": summary,
             "meta": {
                 "paths": {
                     "ref_pitch": str(ref_pitch_path),
@@ -785,13 +905,21 @@ def get_analysis(session_id: str):
                     "events": str(events_path),
                     "summary": str(summary_path),
                 },
-                "counts": {
-                    "ref_track": safe_len(ref_pitch.get("track")) if isinstance(ref_pitch, dict) else None,
-                    "usr_track": safe_len(usr_pitch.get("track")) if isinstance(usr_pitch, dict) else None,
-                    "events": safe_len(events),
-                },
             },
-        })
+        }, ensure_ascii=False)[:-1].encode("utf-8")  # 末尾の '}' を落として開いたまま継ぎ足す
+        payload = b"".join([
+            head,
+            b',"events":', events_path.read_bytes(),
+            b',"ref_pitch":', ref_pitch_path.read_bytes(),
+            b',"usr_pitch":', usr_pitch_path.read_bytes(),
+            b',"summary":', summary_path.read_bytes(),
+            b"}",
+        ])
+
+        resp = Response(payload, mimetype="application/json", direct_passthrough=True)
+        resp.headers["ETag"] = etag
+        resp.headers["Cache-Control"] = "private, max-age=0, must-revalidate"
+        return resp
 
     except FileNotFoundError as e:
         return json_error(404, "FILE_NOT_FOUND", str(e))
@@ -817,9 +945,9 @@ def _ai_comment_core(song_id: str, user_id: str, take_id: Optional[str]):
 
     try:
         if events_path.exists():
-            events = read_json_or_error(events_path, "events")
+            events = read_json_cached(events_path, "events")
         if summary_path.exists():
-            summary = read_json_or_error(summary_path, "summary")
+            summary = read_json_cached(summary_path, "summary")
     except Exception:
         events = []
         summary = {}
@@ -867,22 +995,76 @@ def _ai_comment_core(song_id: str, user_id: str, take_id: Optional[str]):
         "events_head": event_head,
     }
 
-    system = """
-あなたはカラオケ初心者向けの歌のコーチです。専門用語は使いません。
+    system = AI_COMMENT_SYSTEM_PROMPT
 
-出力は必ずJSONのみ：
-{"title": string, "body": string}
+    user = "次のJSONを読んでコメントを作成してください。\n" + json.dumps(model_input, ensure_ascii=False)
 
-ルール：
-- 日本語・短文・絵文字なし
-- bodyは4〜6行まで
-- cents/Hz/MIDI/オクターブ等の用語は禁止（「高い/低い」「1段上/下」に言い換え）
-- 数字は基本1つまで（秒も出さない）
-- 必ず「今日やる練習」を2つ書く（すぐできる内容）
-- 最後に一言だけ励ます
-""".strip()
+    # 同一ペイロードならキャッシュから即返す（LLM呼び出しなし）
+    cache_key = _ai_comment_cache_key(model_input)
 
-    user = "次のJSONを読んでコメントを作成してください。\n" + json.dumps(model_input, ensure_ascii=False)
+    # ストリーミング要求（?stream=1 または Accept: text/event-stream）なら SSE で返す。
+    # 同期呼び出しだとモデル応答が終わるまでワーカーを占有してしまうため、
+    # トークン到着ごとに送出してソケットI/Oと生成を重ねる。
+    wants_stream = (
+        request.args.get("stream") in ("1", "true")
+        or "text/event-stream" in (request.headers.get("Accept") or "")
+    )
+    if wants_stream:
+        def generate():
+            cached = _ai_comment_cache_get(cache_key)
+            if cached is not None:
+                done = {
+                    "ok": True,
+                    "title": cached[0],
+                    "body": cached[1],
+                    "model": AI_MODEL_NAME,
+                    "prompt_version": PROMPT_VERSION_DEFAULT,
+                    "cached": True,
+                }
+                yield "event: done\ndata: " + json.dumps(done, ensure_ascii=False) + "\n\n"
+                return
+            chunks: List[str] = []
+            try:
+                with openai_client.responses.stream(
+                    model=AI_MODEL_NAME,
+                    input=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                ) as stream:
+                    for event in stream:
+                        if event.type == "response.output_text.delta":
+                            chunks.append(event.delta)
+                            yield "data: " + json.dumps({"delta": event.delta}, ensure_ascii=False) + "\n\n"
+                title, body = _normalize_ai_comment("".join(chunks).strip())
+                _ai_comment_cache_put(cache_key, title, body)
+                done = {
+                    "ok": True,
+                    "title": title,
+                    "body": body,
+                    "model": AI_MODEL_NAME,
+                    "prompt_version": PROMPT_VERSION_DEFAULT,
+                }
+                yield "event: done\ndata: " + json.dumps(done, ensure_ascii=False) + "\n\n"
+            except Exception as e:
+                yield "event: error\ndata: " + json.dumps({"ok": False, "message": str(e)}, ensure_ascii=False) + "\n\n"
+
+        return Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    cached = _ai_comment_cache_get(cache_key)
+    if cached is not None:
+        return jsonify({
+            "ok": True,
+            "title": cached[0],
+            "body": cached[1],
+            "model": AI_MODEL_NAME,
+            "prompt_version": PROMPT_VERSION_DEFAULT,
+            "cached": True,
+        })
 
     resp = openai_client.responses.create(
         model=AI_MODEL_NAME,
@@ -894,6 +1076,7 @@ def _ai_comment_core(song_id: str, user_id: str, take_id: Optional[str]):
 
     llm_text = (getattr(resp, "output_text", "") or "").strip()
     title, body = _normalize_ai_comment(llm_text)
+    _ai_comment_cache_put(cache_key, title, body)
 
     return jsonify({
         "ok": True,
@@ -967,14 +1150,15 @@ def history_append(song_id: str, user_id: str):
 
         client_hash = request.headers.get("Idempotency-Key")
         if not client_hash:
-            client_hash = hashlib.sha256(raw).hexdigest()
+            # 重複判定用キーなので暗号強度は不要。blake2b の短縮ダイジェストで足りる
+            client_hash = hashlib.blake2b(raw, digest_size=16).hexdigest()
 
         comment_source = request.headers.get("X-Comment-Source") or "ai"
         prompt_version = request.headers.get("X-Prompt-Version") or PROMPT_VERSION_DEFAULT
         model_name = request.headers.get("X-AI-Model") or AI_MODEL_NAME
         app_version = request.headers.get("X-App-Version")
 
-        history_id = str(uuid.uuid4())
+        history_id = make_history_id()
         created_at = iso_utc_z()
 
         db = get_db()
@@ -1027,20 +1211,31 @@ def history_list(user_id: str):
         prompt = request.args.get("prompt")
         model = request.args.get("model")
         limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
         offset = request.args.get("offset", type=int)
 
         if limit is None:
             limit = 200
         limit = max(1, min(limit, 500))
 
-        if offset is None:
-            offset = 0
-        offset = max(0, offset)
-
         db = get_db()
 
         where = ["user_id = ?"]
-        params = [user_id]
+        params: List[Any] = [user_id]
+
+        # ページングはキーセット方式：前ページ最終行の "<created_at>_<id>" を
+        # cursor として受け取り、(created_at, id) で続きから辿る。
+        # OFFSET と違い、深いページでも読み飛ばしが発生しない。
+        if cursor:
+            try:
+                cur_created, cur_id = cursor.split("_", 1)
+            except ValueError:
+                return json_error(400, "INVALID_CURSOR", f"invalid cursor: {cursor}")
+            where.append("(created_at, id) < (?, ?)")
+            params.extend([cur_created, cur_id])
+        # 旧クライアント互換：cursor を送ってこない場合は従来どおり
+        # offset ページングも受け付ける（iOS 版は offset で load more する）
+        use_offset = not cursor and offset is not None and offset > 0
 
         if source:
             where.append("comment_source = ?")
@@ -1061,11 +1256,15 @@ def history_list(user_id: str):
                 comment_source, prompt_version, model, app_version
             FROM history
             WHERE {" AND ".join(where)}
-            ORDER BY created_at DESC
-            LIMIT ? OFFSET ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
         """
+        params.append(limit)
+        if use_offset:
+            sql += " OFFSET ?"
+            params.append(offset)
 
-        rows = db.execute(sql, tuple(params + [limit, offset])).fetchall()
+        rows = db.execute(sql, tuple(params)).fetchall()
 
         items = []
         for r in rows:
@@ -1090,7 +1289,14 @@ def history_list(user_id: str):
                 "app_version": r["app_version"],
             })
 
-        return jsonify({"ok": True, "user_id": user_id, "items": items, "message": None})
+        # 次ページの頭出し用カーソル（満杯に取れたときだけ）
+        next_cursor = None
+        if len(items) == limit:
+            last = items[-1]
+            next_cursor = f"{last['created_at']}_{last['id']}"
+
+        return jsonify({"ok": True, "user_id": user_id, "items": items,
+                        "next_cursor": next_cursor, "message": None})
 
     except Exception as e:
         return json_error(500, "INTERNAL_ERROR", str(e))
@@ -1,9 +1,61 @@
 import json, math, argparse
 from pathlib import Path
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 def cents(a, b):
     return 1200.0 * math.log2(a / b)
 
+def _scan_numpy(rf, uf, tol):
+    """フレームごとのセント差・低/高/無声ミス判定を配列演算で一括計算する。
+
+    rf/uf は f0[Hz]（欠損は NaN）。戻り値は (cents, low, high, unv_miss, voiced)。
+    """
+    n = rf.shape[0]
+    ref_voiced = ~np.isnan(rf)
+    usr_voiced = ~np.isnan(uf)
+    unv_miss = ref_voiced & ~usr_voiced
+    voiced = ref_voiced & usr_voiced
+    c = np.zeros(n, dtype=np.float64)
+    c[voiced] = 1200.0 * np.log2(uf[voiced] / rf[voiced])
+    low = voiced & (c < -tol)
+    high = voiced & (c > tol)
+    return c, low, high, unv_miss, voiced
+
+if njit is not None:
+    # Numba があれば cents 計算とフラグ生成を1パスに融合する
+    # （NumPy 版は配列を4回なめるので、長尺録音ではメモリ帯域がボトルネックになる）
+    @njit(cache=True, parallel=True)
+    def _scan_fused(rf, uf, tol):  # pragma: no cover - JIT経路
+        n = rf.shape[0]
+        c = np.zeros(n, dtype=np.float64)
+        low = np.zeros(n, np.bool_)
+        high = np.zeros(n, np.bool_)
+        unv_miss = np.zeros(n, np.bool_)
+        voiced = np.zeros(n, np.bool_)
+        for i in prange(n):
+            a = rf[i]
+            b = uf[i]
+            if a == a and b != b:      # 参照のみ有声（NaN は自分自身と不一致）
+                unv_miss[i] = True
+            elif a == a and b == b:
+                voiced[i] = True
+                ci = 1200.0 * np.log2(b / a)
+                c[i] = ci
+                if ci < -tol:
+                    low[i] = True
+                elif ci > tol:
+                    high[i] = True
+        return c, low, high, unv_miss, voiced
+
+    scan_frames = _scan_fused
+else:
+    scan_frames = _scan_numpy
+
 def group_events(flags, times, kind, cents_values=None):
     events = []
     n = len(flags)
@@ -45,61 +97,49 @@ def main():
     if ref.get("sr") != usr.get("sr") or ref.get("hop") != usr.get("hop"):
         raise RuntimeError(f"sr/hop mismatch ref={ref.get('sr')}/{ref.get('hop')} usr={usr.get('sr')}/{usr.get('hop')}")
 
-    ref_tr = ref["track"]
-    usr_tr = usr["track"]
-    n = min(len(ref_tr), len(usr_tr))
+    def track_arrays(d):
+        """旧・行指向 / 新・列指向のどちらの形式からも (t, f0) 配列を取り出す。"""
+        if "track" in d:
+            tr = d["track"]
+            t = np.array([float(p["t"]) for p in tr], dtype=np.float64)
+            f = np.array([np.nan if p.get("f0_hz") is None else float(p["f0_hz"]) for p in tr],
+                         dtype=np.float64)
+        else:
+            t = np.asarray(d["t"], dtype=np.float64)
+            f = np.array([np.nan if v is None else float(v) for v in d["f0_hz"]], dtype=np.float64)
+        return t, f
+
+    ref_t, ref_f = track_arrays(ref)
+    usr_t, usr_f = track_arrays(usr)
+    n = min(len(ref_t), len(usr_t))
 
     sr = float(ref["sr"])
     hop = float(ref["hop"])
     tol = float(args.tol)
 
-    times = []
-    cents_list = []
-    low_flags = []
-    high_flags = []
-    unvoiced_miss_flags = []
-
-    voiced_frames = 0
-    within = 0
-
-    for i in range(n):
-        t0 = float(ref_tr[i]["t"])
-        t1 = t0 + hop / sr
-        times.append((t0, t1))
-
-        rf = ref_tr[i].get("f0_hz")
-        uf = usr_tr[i].get("f0_hz")
-
-        if rf is not None and uf is None:
-            unvoiced_miss_flags.append(True)
-            low_flags.append(False)
-            high_flags.append(False)
-            cents_list.append(0.0)
-            continue
-
-        unvoiced_miss_flags.append(False)
-
-        if rf is None or uf is None:
-            low_flags.append(False)
-            high_flags.append(False)
-            cents_list.append(0.0)
-            continue
+    # トラックを NaN 埋めの配列に展開し、フレーム走査は scan_frames で一括処理
+    rf_arr = ref_f[:n]
+    uf_arr = usr_f[:n]
+    t0_arr = ref_t[:n]
+    t1_arr = t0_arr + hop / sr
+    times = list(zip(t0_arr.tolist(), t1_arr.tolist()))
 
-        voiced_frames += 1
-        c = cents(float(uf), float(rf))
-        cents_list.append(c)
+    cents_arr, low_arr, high_arr, unv_arr, voiced_arr = scan_frames(rf_arr, uf_arr, tol)
 
-        if abs(c) <= tol:
-            within += 1
+    cents_list = cents_arr.tolist()
+    low_flags = low_arr.tolist()
+    high_flags = high_arr.tolist()
+    unvoiced_miss_flags = unv_arr.tolist()
 
-        low_flags.append(c < -tol)
-        high_flags.append(c > tol)
+    voiced_frames = int(voiced_arr.sum())
+    within = int((voiced_arr & (np.abs(cents_arr) <= tol)).sum())
 
     sec_total = round(times[-1][1], 3) if times else 0.0
 
-    voiced_cents = [c for c in cents_list if c != 0.0]
-    mean = sum(voiced_cents)/len(voiced_cents) if voiced_cents else 0.0
-    std = math.sqrt(sum((x-mean)**2 for x in voiced_cents)/len(voiced_cents)) if voiced_cents else 0.0
+    voiced_cents = cents_arr[cents_arr != 0.0]
+    mean = float(voiced_cents.mean()) if voiced_cents.size else 0.0
+    std = float(voiced_cents.std()) if voiced_cents.size else 0.0
+    voiced_cents = voiced_cents.tolist()
 
     def percentile(xs, q):
         if not xs:
@@ -112,7 +152,7 @@ def main():
             return xs[int(k)]
         return xs[f] + (xs[c] - xs[f]) * (k - f)
 
-    unvoiced_miss_seconds = sum((times[i][1]-times[i][0]) for i in range(n) if unvoiced_miss_flags[i])
+    unvoiced_miss_seconds = float(unv_arr.sum()) * (hop / sr)
 
     summary = {
         "tol_cents": tol,
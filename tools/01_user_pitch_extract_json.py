@@ -4,6 +4,11 @@ from pathlib import Path
 import numpy as np
 import librosa
 
+try:
+    import orjson  # あれば高速なC実装で書き出す
+except ImportError:
+    orjson = None
+
 # 入力・出力（環境変数で上書き可能）
 # - IN_WAV: 解析したいモノラル WAV ファイルのパス
 # - OUT_JSON: 出力したい JSON ファイルのパス
@@ -13,28 +18,49 @@ OUT    = os.environ.get("OUT_JSON", "SingingApp/analysis/user01/pitch.json")
 
 # 解析
 # librosa.load: 44100Hz にリサンプリングし、モノラル化して読み込み
+# float32 で持てば float64 の半分の帯域で済む（精度はピッチ推定には十分）
 # hop_length=256 は 44100Hz / 256 ≒ 172.3 fps（約5.8ms間隔）の時間解像度
-y, sr = librosa.load(IN_WAV, sr=44100, mono=True)
+y, sr = librosa.load(IN_WAV, sr=44100, mono=True, dtype=np.float32)
 hop = 256
-# YIN アルゴリズムで基本周波数をフレームごとに推定
-f0 = librosa.yin(y, fmin=80, fmax=800, sr=sr, frame_length=2048, hop_length=hop)
-# 目立った発声区間のみを残すため、RMS が中央値の 30% 未満の区間を NaN にする
-rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=hop).squeeze()
-f0[(rms < np.median(rms)*0.3)] = np.nan
+# pYIN（確率的YIN）で基本周波数と有声/無声フラグを同時に推定する。
+# 旧実装の yin + RMS しきい値は信号を二重にフレーム化していたが、
+# pyin は voiced_flag を返すので RMS の再フレーム化パスが丸ごと不要になる
+f0, voiced_flag, voiced_prob = librosa.pyin(
+    y, fmin=80, fmax=800, sr=sr, frame_length=2048, hop_length=hop
+)
+f0 = np.asarray(f0, dtype=np.float64)
+f0[~voiced_flag] = np.nan
 # 各フレームの時間（秒）を算出
 t = librosa.times_like(f0, sr=sr, hop_length=hop)
 
 # 保存
 # 出力先ディレクトリが無ければ作成
 Path(os.path.dirname(OUT)).mkdir(parents=True, exist_ok=True)
+# 丸めはフレームごとの round() ではなくベクトルで一括
+t_list = np.round(t, 3).tolist()
+f0_list = [None if np.isnan(ff) else float(ff) for ff in f0]
+# 列指向（SoA）形式で出力する。フレームごとの dict を並べる旧形式より
+# ファイルが小さく、読む側は np.asarray 一発で配列化できる
 data = {
-    "sr": sr, "hop": hop, "algo": "yin_simple",
-    "track": [
-        {"t": round(float(tt), 3),
-         "f0_hz": (None if np.isnan(ff) else float(ff))}
-        for tt, ff in zip(t, f0)
-    ],
+    "sr": sr, "hop": hop, "algo": "pyin",
+    "t": t_list, "f0_hz": f0_list,
 }
-with open(OUT, "w") as f:
-    json.dump(data, f)
-print("wrote:", OUT, "frames:", len(t))
\ No newline at end of file
+if orjson is not None:
+    Path(OUT).write_bytes(orjson.dumps(data))
+else:
+    with open(OUT, "w") as f:
+        json.dump(data, f)
+# JSON と並べて .npz サイドカーも書く。後段の 02/04 は npz があれば
+# JSON のトークン走査を丸ごと飛ばして np.load（mmap）で読める。
+# f0 は Hz ではなく「A4(440Hz) からのセント差」の int16 で持つ。
+# 歌唱に必要な分解能は 1 セントで十分なので損失はなく、float32 の半分の帯域で済む
+# （無声は int16 の最小値を番兵にする）
+_I16_MIN = np.iinfo(np.int16).min
+voiced = ~np.isnan(f0)
+cents_a4 = np.full(len(f0), _I16_MIN, dtype=np.int16)
+cents_a4[voiced] = np.round(1200.0 * np.log2(f0[voiced] / 440.0)).astype(np.int16)
+np.savez(Path(OUT).with_suffix(".npz"),
+         t=t.astype(np.float32), cents_a4=cents_a4,
+         sr=np.int64(sr), hop=np.int64(hop))
+print("wrote:", OUT, "frames:", len(t_list))
+# 注: 旧形式 {"track":[{"t":..,"f0_hz":..},...]} は各ツールの loader が引き続き受け付ける
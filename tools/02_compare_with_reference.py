@@ -8,16 +8,27 @@
   - USR_JSON: ユーザーピッチ JSON（省略時: SingingApp/analysis/user01/pitch.json）
   - OUT_JSON: 出力イベント JSON（省略時: SingingApp/analysis/user01/events.json）
 
-ピッチJSONの想定形式:
+ピッチJSONの想定形式（どちらでも可）:
 {
   "sr": 44100,
   "hop": 256,
   "algo": "yin_simple",
-  "track": [{"t": 0.000, "f0_hz": 220.0 or null}, ...]
+  "track": [{"t": 0.000, "f0_hz": 220.0 or null}, ...]   # 旧・行指向
+}
+{
+  "sr": 44100, "hop": 256, "algo": "yin_simple",
+  "t": [0.000, ...], "f0_hz": [220.0 or null, ...]        # 新・列指向（01 が出力）
 }
 """
-import json, math, os, sys
-from typing import List, Dict, Any, Optional
+import json, os, sys
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
+
+try:
+    import orjson  # あればC実装でパース（大きいトラックで数倍速い）
+except ImportError:
+    orjson = None
 
 # ── パラメータ（必要に応じて調整） ───────────────────────────
 PITCH_LOW_TH_CENTS  = -35.0   # これより低ければ「低い」
@@ -26,63 +37,82 @@ MIN_DURATION_SEC    = 0.20    # これ未満は短すぎるので無視
 # ────────────────────────────────────────────────────────
 
 def load_pitch_json(path: str):
-    with open(path, "r") as f:
-        d = json.load(f)
-    t = [float(p["t"]) for p in d["track"]]
-    f0 = []
-    for p in d["track"]:
-        v = p.get("f0_hz", None)
-        f0.append(None if v is None else float(v))
-    return d.get("sr", 44100), d.get("hop", 256), t, f0
-
-def align_user_to_ref(t_ref, t_usr) -> List[Optional[int]]:
-    """参照の各時刻に最も近いユーザーフレームのインデックスを返す"""
-    # ユーザー側のピッチ系列が空の場合
-    # ・後続の処理で「ユーザー値なし」を素直に表現できるよう None を返す
-    # ・長さは参照フレーム数と合わせておき、以降の zip / list 内包表記で
-    #   インデックスがずれたり、長さが異なることによる例外を防ぐ
-    #   （配列長が合っていれば後続処理は単に None とみなして通過する）
-    # ・ここで None を返すことで、後続の f_usr_on_ref 生成でインデックスアクセスを
-    #   そもそも実行しなくて済み、IndexError や空配列に対する min/max といった
-    #   エラーを未然に防ぐ「入口の安全網」として機能する
-    if not t_usr:
-        return [None] * len(t_ref)
-
-    # 二分探索（searchsorted 相当の簡易版）
-    # - t_ref は単調増加を仮定
-    # - t_usr も同様に単調増加である前提にし、1 回の走査で最寄りフレームを決定する
-    # - j を前回位置から進めるだけなので O(len(t_ref) + len(t_usr)) で計算できる
-    idx = []
-    j = 0
-    for tr in t_ref:
-        # t_usr[j] <= tr となる最大 j を探す
-        while j + 1 < len(t_usr) and t_usr[j + 1] <= tr:
-            j += 1
-        # j と j+1 のどちらが近いか
-        if j + 1 < len(t_usr) and abs(t_usr[j + 1] - tr) < abs(t_usr[j] - tr):
-            idx.append(j + 1)
+    # 01 が書く .npz サイドカーがあれば優先する（mmap 読みで JSON パース不要）。
+    # JSON の方が新しい場合は古いキャッシュとみなして無視する
+    npz_path = Path(path).with_suffix(".npz")
+    if npz_path.exists() and npz_path.stat().st_mtime >= os.path.getmtime(path):
+        d = np.load(npz_path, mmap_mode="r")
+        t = np.asarray(d["t"], dtype=np.float64)
+        if "cents_a4" in d:
+            # int16「A4 からのセント差」形式。log2(f0) は log2(440)+c/1200 の
+            # 足し算だけで復元でき、Hz への指数変換も有声フレームだけで済む
+            c = np.asarray(d["cents_a4"], dtype=np.float64)
+            unvoiced = np.asarray(d["cents_a4"]) == np.iinfo(np.int16).min
+            f0_log = np.where(unvoiced, np.nan, np.log2(440.0) + c / 1200.0)
+            f0 = np.where(unvoiced, np.nan, np.exp2(f0_log))
         else:
-            idx.append(j)
-    return idx
-
-def hz_to_cents_ratio(f_usr, f_ref):
-    """比率からセント差を計算（どちらか欠損なら None）"""
-    if f_usr is None or f_ref is None or f_usr <= 0 or f_ref <= 0:
-        return None
-    return 1200.0 * math.log2(f_usr / f_ref)
-
-def segment_mask(mask: List[bool], min_len_frames: int):
-    """True が連続する区間を [start, end) で返す（end は含まない）"""
-    out = []
-    s = None
-    for i, v in enumerate(mask + [False]):  # 番兵
-        if v and s is None:
-            s = i
-        elif not v and s is not None:
-            if i - s >= min_len_frames:
-                out.append((s, i))
-            s = None
-    return out
+            # 旧サイドカー（float32 Hz）
+            f0 = np.asarray(d["f0"], dtype=np.float64)
+            with np.errstate(invalid="ignore"):
+                f0_log = np.where(f0 > 0, np.log2(f0), np.nan)
+        return int(d["sr"]), int(d["hop"]), t, f0, f0_log
+
+    if orjson is not None:
+        with open(path, "rb") as f:
+            d = orjson.loads(f.read())
+    else:
+        with open(path, "r") as f:
+            d = json.load(f)
+    # 時間と f0 は numpy 配列で返す（欠損は NaN）。後段を配列演算にするための下準備
+    if "track" in d:
+        # 旧・行指向は1パスで確保済み配列へ直接書き込む。
+        # 内包表記2本だと dict 引きと中間リスト生成が2回ずつ走る
+        tr = d["track"]
+        t = np.empty(len(tr), dtype=np.float64)
+        f0 = np.empty(len(tr), dtype=np.float64)
+        for i, p in enumerate(tr):
+            t[i] = p["t"]
+            v = p.get("f0_hz")
+            f0[i] = np.nan if v is None else v
+    else:
+        # 列指向形式はフレームごとの dict 巡回が不要で、ほぼ配列化一発で済む
+        t = np.asarray(d["t"], dtype=np.float64)
+        f0 = np.array([np.nan if v is None else float(v) for v in d["f0_hz"]], dtype=np.float64)
+    # log2 はトラックごとに一度だけ計算して持ち回る。
+    # セント差は 1200*(log2(u) - log2(r)) の引き算になり、比較のたびの除算+log2 が消える
+    with np.errstate(invalid="ignore"):
+        f0_log = np.where(f0 > 0, np.log2(f0), np.nan)
+    return d.get("sr", 44100), d.get("hop", 256), t, f0, f0_log
+
+def align_user_to_ref(t_ref, t_usr) -> np.ndarray:
+    """参照の各時刻に最も近いユーザーフレームのインデックスを返す"""
+    # ユーザー側のピッチ系列が空の場合は呼び出し側で f0 を NaN 埋めする前提で
+    # ダミーの 0 を返す（長さは参照フレーム数に合わせる）
+    if len(t_usr) == 0:
+        return np.zeros(len(t_ref), dtype=np.int64)
+
+    # searchsorted で「参照時刻がユーザー列のどこに挿入されるか」を一括で求め、
+    # 直前・直後のどちらが近いかをベクトル比較で決める
+    # （04_plot_compare.py の align_to_ref と同じパターン。Python ループ版の
+    #   O(N+M) 走査よりインタプリタ往復が無い分だけ桁違いに速い）
+    idx = np.searchsorted(t_usr, t_ref)
+    idx = np.clip(idx, 1, len(t_usr) - 1)
+    choose = np.where(np.abs(t_usr[idx - 1] - t_ref) <= np.abs(t_usr[idx] - t_ref), idx - 1, idx)
+    return choose
+
+def segment_mask(mask: Sequence[bool], min_len_frames: int) -> List[Tuple[int, int]]:
+    """True が連続する区間を [start, end) で返す（end は含まない）
+
+    mask は bool の numpy 配列でもリストでもよい（番兵用のリスト連結は行わない）。
+    """
+    # 前後に False を足した差分で立ち上がり(+1)/立ち下がり(-1)の位置を取る。
+    # Python で 1 要素ずつ舐める代わりに、区間境界の検出を配列演算で一括処理する
+    m = np.concatenate(([False], np.asarray(mask, dtype=bool), [False])).astype(np.int8)
+    d = np.diff(m)
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1)
+    keep = (ends - starts) >= min_len_frames
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
 
 def main():
     # 入出力パス（環境変数優先、無ければ既定値）
@@ -92,34 +122,38 @@ def main():
     os.makedirs(os.path.dirname(OUT_JSON), exist_ok=True)
 
     # 読み込み
-    sr_r, hop_r, t_ref, f_ref = load_pitch_json(REF_JSON)
-    sr_u, hop_u, t_usr, f_usr = load_pitch_json(USR_JSON)
+    sr_r, hop_r, t_ref, f_ref, lf_ref = load_pitch_json(REF_JSON)
+    sr_u, hop_u, t_usr, f_usr, lf_usr = load_pitch_json(USR_JSON)
 
     # 参照のフレームレートから 1フレーム秒数を推定
     fps = sr_r / float(hop_r) if hop_r else 172.0
     min_frames = max(1, int(round(MIN_DURATION_SEC * fps)))
 
     # 時間合わせ（参照各フレーム→最も近いユーザーフレーム）
-    # ・ユーザーピッチが欠損している場合でも align_user_to_ref は参照長の None を返す
-    # ・None をそのまま f_usr_on_ref に持ち込むことで「ユーザー音が無い」ことを
-    #   明示的に表現し、後段のセント差計算やマスク生成が安全にスキップできる
+    # ・choose はインデックス配列なので fancy indexing 一発でマッピングできる
+    # ・ユーザーピッチが空なら「ユーザー音が無い」を NaN 埋めで表現し、
+    #   後段のセント差計算やマスク生成が安全にスキップできる
     choose = align_user_to_ref(t_ref, t_usr)
-    f_usr_on_ref = [f_usr[i] if (i is not None and 0 <= i < len(f_usr)) else None
-                    for i in choose]
-
-    # セント差リスト（None は欠損）
-    # - None は参照 or ユーザーの無声・欠測を示し、hz_to_cents_ratio 内で落とす
-    # - 計算できるものだけ数値が入り、後続の区間抽出で「有効データのみ」平均化する
-    cents = [hz_to_cents_ratio(u, r) for u, r in zip(f_usr_on_ref, f_ref)]
-
-    # 判定用マスク
-    is_low  = [ (c is not None) and (c <  PITCH_LOW_TH_CENTS)  for c in cents ]
-    is_high = [ (c is not None) and (c >  PITCH_HIGH_TH_CENTS) for c in cents ]
+    if len(f_usr):
+        f_usr_on_ref = f_usr[choose]
+        lf_usr_on_ref = lf_usr[choose]
+    else:
+        f_usr_on_ref = np.full(len(t_ref), np.nan)
+        lf_usr_on_ref = np.full(len(t_ref), np.nan)
+
+    # セント差配列（NaN は欠損）
+    # - 事前計算済みの log2 同士の引き算だけで済む（無声は log 側が NaN なのでそのまま落ちる）
+    valid = np.isfinite(lf_ref) & np.isfinite(lf_usr_on_ref)
+    cents = np.full(len(t_ref), np.nan)
+    cents[valid] = 1200.0 * (lf_usr_on_ref[valid] - lf_ref[valid])
+
+    # 判定用マスク（すべて bool 配列）
+    is_low  = valid & (cents < PITCH_LOW_TH_CENTS)
+    is_high = valid & (cents > PITCH_HIGH_TH_CENTS)
     # 参照に声はあるがユーザーが無声
     # - 「歌うべき箇所なのに声が無い」ことを拾うためのマスク
-    # - f_usr_on_ref が None / 0 以下を「無声」とみなし、参照側が有声なら欠損扱い
-    unvoiced_miss = [ (r is not None and r > 0) and (u is None or u <= 0)
-                      for r, u in zip(f_ref, f_usr_on_ref) ]
+    # - NaN や 0 以下は ~(x > 0) で「無声」に落ちる
+    unvoiced_miss = (f_ref > 0) & ~(f_usr_on_ref > 0)
 
     # 区間抽出
     # - is_low / is_high / unvoiced_miss はフレーム単位の真偽配列なので、
@@ -127,26 +161,62 @@ def main():
     # - これにより瞬間的な揺れや検出ミスを平滑化し、実用的な警告だけを残す
     events: List[Dict[str, Any]] = []
 
-    for s, e in segment_mask(is_low, min_frames):
-        seg = [c for c in cents[s:e] if c is not None]
-        avg = sum(seg) / len(seg) if seg else 0.0
-        mx  = max(seg, key=abs) if seg else 0.0
-        events.append({
+    finite = np.isfinite(cents)
+    cs = np.where(finite, cents, 0.0)
+
+    def stats_events(mask, kind):
+        """マスク区間ごとの avg/max セントを reduceat で一括集計してイベント化する。"""
+        spans = segment_mask(mask, min_frames)
+        if not spans:
+            return []
+        starts = np.fromiter((s for s, _ in spans), dtype=np.int64, count=len(spans))
+        ends = np.fromiter((e for _, e in spans), dtype=np.int64, count=len(spans))
+
+        # reduceat に start/end を交互に並べた境界列を渡し、偶数番目（= [s, e) 区間）
+        # だけを取り出す。末尾の end が配列長と一致する場合は reduceat の仕様上
+        # 落とす（最後の区間は自動的に配列末尾まで集計される）
+        bounds = np.ravel(np.column_stack([starts, ends]))
+        if bounds[-1] >= len(cents):
+            bounds = bounds[:-1]
+        sums = np.add.reduceat(cs, bounds)[::2]
+        cnts = np.add.reduceat(finite.astype(np.int64), bounds)[::2]
+        vmax = np.maximum.reduceat(np.where(finite, cents, -np.inf), bounds)[::2]
+        vmin = np.minimum.reduceat(np.where(finite, cents, np.inf), bounds)[::2]
+
+        avg = np.where(cnts > 0, sums / np.maximum(cnts, 1), 0.0)
+        # 絶対値が大きい方を符号付きで採用（元の「|c| 最大の要素」の集約と同じ）
+        mx = np.where(np.abs(vmin) >= np.abs(vmax), vmin, vmax)
+        mx = np.where(cnts > 0, mx, 0.0)
+
+        return [{
             "start": round(t_ref[s], 3),
             "end":   round(t_ref[e - 1], 3),
-            "type":  "pitch_low",
-            "avg_cents": round(avg, 1),
-            "max_cents": round(mx, 1),
-        })
+            "type":  kind,
+            "avg_cents": round(float(a), 1),
+            "max_cents": round(float(m), 1),
+        } for s, e, a, m in zip(starts.tolist(), ends.tolist(), avg.tolist(), mx.tolist())]
 
-    for s, e in segment_mask(is_high, min_frames):
-        seg = [c for c in cents[s:e] if c is not None]
-        avg = sum(seg) / len(seg) if seg else 0.0
-        mx  = max(seg, key=abs) if seg else 0.0
+    events += stats_events(is_low, "pitch_low")
+    events += stats_events(is_high, "pitch_high")
+
+    for s, e in segment_mask(unvoiced_miss, min_frames):
         events.append({
             "start": round(t_ref[s], 3),
             "end":   round(t_ref[e - 1], 3),
-            "type":  "pitch_high",
-            "avg_cents": round(avg, 1),
-            "max_cents": round(mx, 1),
-        })
\ No newline at end of file
+            "type":  "unvoiced_miss",
+        })
+
+    events.sort(key=lambda ev: ev["start"])
+
+    # 書き出し（orjson があればC実装で一括シリアライズ。numpy スカラーもそのまま通す）
+    if orjson is not None:
+        Path(OUT_JSON).write_bytes(orjson.dumps(events, option=orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        # 機械が読むファイルなので区切りは詰める（既定の ", " / ": " より3割ほど小さい）。
+        # バッファも 64KB に広げて write() 回数を減らす
+        with open(OUT_JSON, "w", buffering=65536) as f:
+            json.dump(events, f, ensure_ascii=False, separators=(",", ":"))
+    print("wrote:", OUT_JSON, "events:", len(events))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
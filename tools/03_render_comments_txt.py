@@ -21,11 +21,34 @@ def mmss(seconds: float) -> str:
     ぱっと見で位置が分かるようにしている。
     """
 
-    minutes = int(seconds // 60)
-    remain = seconds - minutes * 60
-    return f"{minutes:02d}:{remain:05.2f}"
+    minutes, remain = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{remain:05.2f}"
+
+
+# イベント種別→コメント雛形の対応表（やさしい表現）。
+# if 連鎖の代わりにテーブル引きにして、1 イベントあたりの分岐と
+# 文字列組み立てを format 1 回にまとめる
+COMMENT_TEMPLATES: Dict[str, str] = {
+    "pitch_high": (
+        "{t1}〜{t2}：音が少し高い傾向です。"
+        "あごを少し下げ、口を縦に開きすぎないで、息を少し弱める意識で歌い直してみましょう。"
+    ),
+    "pitch_low": (
+        "{t1}〜{t2}：音が少し低い傾向です。背すじを伸ばして目線をやや上に。"
+        "口の中を少し広くして、息のスピードを少しだけ速めてみましょう。"
+    ),
+    "unvoiced_miss": (
+        "{t1}〜{t2}：声が入っていません。直前で軽く息を吸って、"
+        "次の言葉を先に口パクで作ってから発声を始めると入りやすいです。"
+    ),
+}
+# 予備（該当なし）
+COMMENT_FALLBACK = (
+    "{t1}〜{t2}：タイミングや音程が不安定です。"
+    "姿勢を整え、浅く短く吸ってから余裕をもって入ってみましょう。"
+)
+
 
-# イベント→コメントの定義（やさしい表現）
 def event_to_comment(event: Dict[str, Any]) -> str:
     """検出イベント 1 件をわかりやすい日本語コメントに変換する。
 
@@ -36,36 +59,8 @@ def event_to_comment(event: Dict[str, Any]) -> str:
 
     start = float(event["start"])
     end = float(event.get("end", start + 0.2))
-    t1 = mmss(start)
-    t2 = mmss(end)
-    typ = str(event["type"])
-
-    if typ == "pitch_high":
-        # 高めにズレ
-       return (
-            f"{t1}〜{t2}：音が少し高い傾向です。"
-            "あごを少し下げ、口を縦に開きすぎないで、息を少し弱める意識で歌い直してみましょう。"
-        )
-    
-    if typ == "pitch_low":
-        # 低めにズレ
-        return (
-            f"{t1}〜{t2}：音が少し低い傾向です。背すじを伸ばして目線をやや上に。"
-            "口の中を少し広くして、息のスピードを少しだけ速めてみましょう。"
-        )
-    
-    if typ == "unvoiced_miss":
-        # 声が出ていない
-        return (
-            f"{t1}〜{t2}：声が入っていません。直前で軽く息を吸って、"
-            "次の言葉を先に口パクで作ってから発声を始めると入りやすいです。"
-        )
-    
-    # 予備（該当なし）
-    return (
-        f"{t1}〜{t2}：タイミングや音程が不安定です。"
-        "姿勢を整え、浅く短く吸ってから余裕をもって入ってみましょう。"
-    )
+    template = COMMENT_TEMPLATES.get(str(event["type"]), COMMENT_FALLBACK)
+    return template.format(t1=mmss(start), t2=mmss(end))
 
 def load_events(path: Path) -> List[Dict[str, Any]]:
     """イベント JSON を読み込む。
@@ -85,10 +80,10 @@ def main() -> None:
     comments = [event_to_comment(event) for event in events]
 
     OUT_TXT.parent.mkdir(parents=True, exist_ok=True)
-    with OUT_TXT.open("w", encoding="utf-8") as f:
-        f.write("■ 要所コメント（自動生成）\n")
-        for message in comments[:200]:  # 多すぎると読みにくいので上限
-            f.write(f"- {message}\n")
+    # 1 行ずつ write() せず、join でまとめてから一度に書き出す
+    lines = ["■ 要所コメント（自動生成）"]
+    lines += [f"- {message}" for message in comments[:200]]  # 多すぎると読みにくいので上限
+    OUT_TXT.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
     print(f"wrote: {OUT_TXT}  items:{len(comments)}")
 
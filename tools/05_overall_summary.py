@@ -1,7 +1,9 @@
 # tools/05_overall_summary.py
-import json, os, math
+import os, math
 from pathlib import Path
 import numpy as np
+from _jsonio import load_json, dump_json
+from _pitchlib import load_pitch, align_uniform
 
 # ----- 入出力パス（既定値） -----
 REF_JSON = os.environ.get("REF_JSON", "SingingApp/analysis/sample01/pitch.json")
@@ -15,25 +17,23 @@ TOL_CENTS   = float(os.environ.get("TOL_CENTS", "40"))     # 許容帯 ±40c 既
 MIN_SECONDS = float(os.environ.get("MIN_SECONDS", "15"))   # 有効データがこの秒数未満なら「データ不足」
 
 # ----- 共有関数 -----
-def load_pitch_json(p):
-    d = json.load(open(p))
-    t = np.array([float(x["t"]) for x in d["track"]], dtype=float)
-    f = np.array([np.nan if x["f0_hz"] is None else float(x["f0_hz"]) for x in d["track"]], dtype=float)
-    return t, f, d.get("sr", 44100), d.get("hop", 256)
-
-def align_on_ref(t_ref, t_usr):
-    """参照タイムスタンプ t_ref に一番近いユーザーのインデックスを返す"""
-    idx = np.searchsorted(t_usr, t_ref)
-    idx = np.clip(idx, 1, len(t_usr)-1)
-    return np.where(np.abs(t_usr[idx-1]-t_ref) <= np.abs(t_usr[idx]-t_ref), idx-1, idx)
+# 読み込みと最近傍アライメントは _pitchlib の共通実装を使う
+
+def event_arrays(ev):
+    """イベント列を (start, end, type) の構造化配列へ一度だけ変換する。
+
+    種類別の秒数集計を何度行っても、Python レベルの走査はこの1回で済む。
+    """
+    return np.array([(float(e["start"]), float(e.get("end", e["start"])), e.get("type", ""))
+                     for e in ev],
+                    dtype=[("s", np.float64), ("e", np.float64), ("type", "U32")])
 
 def dur_from_events(ev, evtype=None):
-    if ev is None: return 0.0
-    s = 0.0
-    for e in ev:
-        if (evtype is None) or (e.get("type")==evtype):
-            s += float(e.get("end", e["start"])) - float(e["start"])
-    return max(0.0, s)
+    if ev is None or len(ev) == 0: return 0.0
+    arr = ev if isinstance(ev, np.ndarray) else event_arrays(ev)
+    # 型の絞り込みも合計もマスク付きリダクション1本で行う
+    m = slice(None) if evtype is None else arr["type"] == evtype
+    return max(0.0, float(arr["e"][m].sum() - arr["s"][m].sum()))
 
 def percentile(x, q):
     return float(np.nanpercentile(x, q)) if x.size else float("nan")
@@ -41,11 +41,11 @@ def percentile(x, q):
 # ----- メイン処理 -----
 def main():
     # 1) 読み込み
-    tR, fR, srR, hopR = load_pitch_json(REF_JSON)
-    tU, fU, srU, hopU = load_pitch_json(USR_JSON)
+    tR, fR, srR, hopR = load_pitch(REF_JSON)
+    tU, fU, srU, hopU = load_pitch(USR_JSON)
 
     # 2) 時間合わせ（参照にユーザーを合わせる）
-    idx = align_on_ref(tR, tU)
+    idx = align_uniform(tR, tU)
     fU_on_R = fU[idx]
 
     # 3) 有声フレームで差分（セント）を計算
@@ -79,10 +79,11 @@ def main():
     ev = None
     if os.path.exists(EVT_JSON):
         try:
-            ev = json.load(open(EVT_JSON))
+            ev = load_json(EVT_JSON)
         except Exception:
             ev = None
-    uv_sec = dur_from_events(ev, "unvoiced_miss") if ev else 0.0
+    ev_arr = event_arrays(ev) if ev else None
+    uv_sec = dur_from_events(ev_arr, "unvoiced_miss") if ev else 0.0
 
     # 6) 総評のルール
     verdict = "insufficient_data"
@@ -135,7 +136,7 @@ def main():
         "tips": tips,
     }
     Path(os.path.dirname(OUT_JSON)).mkdir(parents=True, exist_ok=True)
-    json.dump(out, open(OUT_JSON, "w"), ensure_ascii=False, indent=2)
+    dump_json(out, OUT_JSON, pretty=True)
 
     # TXT も
     with open(OUT_TXT, "w") as f:
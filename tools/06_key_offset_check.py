@@ -1,7 +1,9 @@
 # 06_key_offset_check.py
-import os, json, math, random
+import os, math, random
 from pathlib import Path
 import numpy as np
+from _jsonio import dump_json
+from _pitchlib import load_pitch, align_uniform
 
 REF_JSON = os.environ.get("REF_JSON", "SingingApp/analysis/sample01/pitch.json")
 USR_JSON = os.environ.get("USR_JSON", "SingingApp/analysis/user01/pitch.json")
@@ -11,16 +13,7 @@ OUT_TXT  = os.environ.get("OUT_TXT",  "SingingApp/analysis/user01/key_offset.txt
 # 日本語固定（専門語を使う場合はその場で説明を付ける）
 LANG_JA = True
 
-def load_pitch_json(p):
-    d = json.load(open(p))
-    t = np.array([float(x["t"]) for x in d["track"]], dtype=float)
-    f = np.array([np.nan if x["f0_hz"] is None else float(x["f0_hz"]) for x in d["track"]], dtype=float)
-    return t, f, d.get("sr", 44100), d.get("hop", 256)
-
-def align_on_ref(t_ref, t_usr):
-    idx = np.searchsorted(t_usr, t_ref)
-    idx = np.clip(idx, 1, len(t_usr)-1)
-    return np.where(np.abs(t_usr[idx-1]-t_ref) <= np.abs(t_usr[idx]-t_ref), idx-1, idx)
+# 読み込みと最近傍アライメントは _pitchlib の共通実装を使う
 
 # 用語の短い説明（必要なものだけ後で付ける）
 def glossary_items(use_octave=False, use_semitone=False, use_cents=False):
@@ -95,10 +88,10 @@ def make_advice_ja(verdict, k_oct, semi, med_wrap, std_wrap, within40):
     return header + "\n" + "\n".join(f"- {t}" for t in tips)
 
 def main():
-    tR, fR, srR, hopR = load_pitch_json(REF_JSON)
-    tU, fU, srU, hopU = load_pitch_json(USR_JSON)
+    tR, fR, srR, hopR = load_pitch(REF_JSON)
+    tU, fU, srU, hopU = load_pitch(USR_JSON)
 
-    idx = align_on_ref(tR, tU)
+    idx = align_uniform(tR, tU)
     fU_on_R = fU[idx]
 
     mask = (~np.isnan(fR)) & (~np.isnan(fU_on_R)) & (fR > 0) & (fU_on_R > 0)
@@ -171,7 +164,7 @@ def main():
         }
 
     Path(os.path.dirname(OUT_JSON)).mkdir(parents=True, exist_ok=True)
-    json.dump(out, open(OUT_JSON, "w"), ensure_ascii=False, indent=2)
+    dump_json(out, OUT_JSON, pretty=True)
 
     with open(OUT_TXT, "w") as f:
         if "error" in out:
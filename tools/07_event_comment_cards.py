@@ -1,6 +1,8 @@
 # tools/07_event_comment_cards.py
-import os, json
+import os
 from pathlib import Path
+import numpy as np
+from _jsonio import load_json, dump_json
 
 IN_EVENTS = os.environ.get("IN_EVENTS",  "SingingApp/analysis/user01/events.json")
 OUT_JSON  = os.environ.get("OUT_JSON",   "SingingApp/analysis/user01/comments.json")
@@ -9,46 +11,50 @@ MAX_ITEMS = int(os.environ.get("MAX_ITEMS", "200"))
 
 Path(os.path.dirname(OUT_JSON)).mkdir(parents=True, exist_ok=True)
 
-def H(sec: float) -> str:
-    m = int(sec // 60)
-    s = sec - m*60
-    return f"{m:02d}:{s:05.2f}"
-
-def make_message(e: dict) -> str:
-    t1 = H(float(e["start"]))
-    t2 = H(float(e.get("end", e["start"] + 0.2)))
-    typ = e.get("type", "other")
-    cents = e.get("avg_cents", 0.0)
-
-    if typ == "pitch_high":
-        return f"{t1}–{t2} 少し高め。息を急ぎすぎない、口の形を小さくしすぎない。出だしを落ち着いて。"
-    elif typ == "pitch_low":
-        return f"{t1}–{t2} 少し低め。息のスピードを少し上げる、口の中を少し広く。声を前に出す意識。"
-    elif typ == "unvoiced_miss":
-        return f"{t1}–{t2} 声が入っていないか弱い。直前で静かに息を準備→はっきり声を置く。"
-    elif typ == "early_entry":
-        return f"{t1}–{t2} 早入り。伴奏の区切りを数えて“1,2,3”で入る。足で軽く拍を取る。"
-    elif typ == "late_entry":
-        return f"{t1}–{t2} 遅入り。入る直前に小さく息を吸い、迷わずあたまの音を置く。"
-    else:
-        return f"{t1}–{t2} 音程やタイミングが不安定。肩と首の力を抜き、最初の母音をはっきり。"
+# 種別→文面の対応表（03 と同じテーブル引き。if 連鎖と per-event の
+# f-string 組み立てを format 1 回にまとめる）
+MESSAGE_TEMPLATES = {
+    "pitch_high":    "{t1}–{t2} 少し高め。息を急ぎすぎない、口の形を小さくしすぎない。出だしを落ち着いて。",
+    "pitch_low":     "{t1}–{t2} 少し低め。息のスピードを少し上げる、口の中を少し広く。声を前に出す意識。",
+    "unvoiced_miss": "{t1}–{t2} 声が入っていないか弱い。直前で静かに息を準備→はっきり声を置く。",
+    "early_entry":   "{t1}–{t2} 早入り。伴奏の区切りを数えて“1,2,3”で入る。足で軽く拍を取る。",
+    "late_entry":    "{t1}–{t2} 遅入り。入る直前に小さく息を吸い、迷わずあたまの音を置く。",
+}
+MESSAGE_FALLBACK = "{t1}–{t2} 音程やタイミングが不安定。肩と首の力を抜き、最初の母音をはっきり。"
+
+def H_all(sec: np.ndarray) -> list:
+    """秒数の配列を MM:SS.ss 形式の文字列リストへまとめて変換する。
+
+    分・秒の分解を配列演算で先に済ませ、Python レベルでは整形だけを行う
+    （イベントごとに関数を3回呼ぶ旧 H() 方式の置き換え）。
+    """
+    m = (sec // 60).astype(int)
+    s = sec - m * 60
+    return [f"{mi:02d}:{si:05.2f}" for mi, si in zip(m.tolist(), s.tolist())]
 
 def main():
-    ev = json.load(open(IN_EVENTS))
+    ev = load_json(IN_EVENTS)
     ev = sorted(ev, key=lambda x: x.get("start", 0.0))
     if MAX_ITEMS > 0:
         ev = ev[:MAX_ITEMS]
 
+    # 開始/終了は一度だけ配列化し、タイムスタンプ文字列を一括生成する
+    starts = np.array([float(e["start"]) for e in ev], dtype=np.float64)
+    ends = np.array([float(e.get("end", e["start"] + 0.2)) for e in ev], dtype=np.float64)
+    t1s = H_all(starts)
+    t2s = H_all(ends)
+
     rows = []
-    for e in ev:
+    for e, s, en, t1, t2 in zip(ev, starts.tolist(), ends.tolist(), t1s, t2s):
+        typ = e.get("type", "other")
         rows.append({
-            "start": float(e["start"]),
-            "end": float(e.get("end", e["start"]+0.2)),
-            "type": e.get("type","other"),
-            "text": make_message(e)
+            "start": s,
+            "end": en,
+            "type": typ,
+            "text": MESSAGE_TEMPLATES.get(typ, MESSAGE_FALLBACK).format(t1=t1, t2=t2)
         })
 
-    json.dump({"comments": rows}, open(OUT_JSON, "w"), ensure_ascii=False, indent=2)
+    dump_json({"comments": rows}, OUT_JSON, pretty=True)
 
     with open(OUT_TXT, "w", encoding="utf-8") as f:
         f.write("■ 要所コメント（最大" + str(MAX_ITEMS) + "件）\n")
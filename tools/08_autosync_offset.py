@@ -1,7 +1,9 @@
 # tools/08_autosync_offset.py
-import os, json, math, subprocess, shutil
+import os, math, subprocess, shutil
 from pathlib import Path
 import numpy as np
+from _jsonio import load_json, dump_json
+from _pitchlib import align_uniform, extract_track
 
 REF_JSON   = os.environ.get("REF_JSON",  "SingingApp/analysis/sample01/pitch.json")
 USR_JSON   = os.environ.get("USR_JSON",  "SingingApp/analysis/user01/pitch.json")
@@ -13,9 +15,10 @@ MIN_DUR    = 0.20  # 20ms×10=約0.2s相当（イベント最小長）
 Path(os.path.dirname(OUT_SHIFT)).mkdir(parents=True, exist_ok=True)
 
 def load_pitch(path):
-    d = json.load(open(path))
-    t = np.array([float(x["t"]) for x in d["track"]], dtype=float)
-    f = np.array([np.nan if x["f0_hz"] is None else float(x["f0_hz"]) for x in d["track"]], dtype=float)
+    # ここでは後段の shift_user_pitch がパース済み dict をそのまま
+    # 組み直して書き出すため、配列抽出だけでなく d も一緒に返す
+    d = load_json(path)
+    t, f = extract_track(d)
     sr = int(d.get("sr", 44100))
     hop = int(d.get("hop", 256))
     return d, t, f, sr, hop
@@ -28,55 +31,51 @@ def crosscorr_offset(tR, mR, tU, mU, max_shift):
     シンプルな相互相関。時間軸は参照のフレーム時間に合わせる。
     """
     # 参照のフレーム数にユーザーを最近傍で合わせる
-    idx = np.searchsorted(tU, tR)
-    idx = np.clip(idx, 1, len(tU)-1)
-    choose = np.where(np.abs(tU[idx-1]-tR) <= np.abs(tU[idx]-tR), idx-1, idx)
-    mU_on_R = mU[choose].astype(float)
+    # （0/1 マスクなので float32 で十分。FFT のメモリ帯域も半分になる）
+    mU_on_R = mU[align_uniform(tR, tU)].astype(np.float32)
+    mR = np.asarray(mR, dtype=np.float32)
 
     # シフト探索（フレーム単位）
     dt = float(np.median(np.diff(tR))) if len(tR) > 1 else 0.01
     max_shift_frames = int(round(max_shift / dt))
-    best_score = -1.0
-    best_k = 0
-    for k in range(-max_shift_frames, max_shift_frames+1):
-        if k < 0:
-            a = mR[-k:]; b = mU_on_R[:len(a)]
-        elif k > 0:
-            a = mR[:-k]; b = mU_on_R[k:k+len(a)]
-        else:
-            a = mR; b = mU_on_R
-        if len(a) < 10:
-            continue
-        score = np.dot(a.astype(float), b.astype(float))
-        if score > best_score:
-            best_score = score
-            best_k = k
+    n = len(mR)
+
+    # ラグごとに Python でスライス＋dot すると O(N·K)（±3s で1000回超の
+    # ループ）。FFT の円相関1回なら全ラグのスコアがまとめて出る。
+    # ゼロ詰めで nfft ≥ n+K にして正負ラグの巡回折り返しを防ぐ
+    K = min(max_shift_frames, max(0, n - 10))  # 重なり10フレーム未満のラグは元実装どおり捨てる
+    nfft = 1 << int(n + K).bit_length()
+    corr = np.fft.irfft(np.fft.rfft(mU_on_R, nfft) * np.conj(np.fft.rfft(mR, nfft)), nfft)
+    # corr[k] = Σ_i mR[i]·mU_on_R[i+k]（負のラグは配列末尾に巡回して並ぶ）
+    scores = np.concatenate([corr[nfft - K:] if K > 0 else corr[:0], corr[:K + 1]])
+    best = int(np.argmax(scores))
+    best_k = best - K
     # フレーム→秒
-    return best_k * dt, best_score
+    return best_k * dt, float(scores[best])
 
 def shift_user_pitch(dU, shift_sec):
     # 時刻にシフトを加えるだけ（データ密度は変えない）
-    tr = []
-    for p in dU["track"]:
-        tr.append({"t": float(p["t"]) + float(shift_sec),
-                   "f0_hz": p["f0_hz"]})
     out = dict(dU)
-    out["track"] = tr
+    if "track" in dU:
+        # 旧・行指向入力のみ dict を組み直す（01 の列指向出力が主流になれば消せる）
+        tr = []
+        for p in dU["track"]:
+            tr.append({"t": float(p["t"]) + float(shift_sec),
+                       "f0_hz": p["f0_hz"]})
+        out["track"] = tr
+    else:
+        # 列指向ならベクトル加算1回。配列のまま返して dump_json に直接渡す
+        out["t"] = np.asarray(dU["t"], dtype=np.float64) + float(shift_sec)
     out["autosync_shift_sec"] = shift_sec
     return out
 
 def compare_make_events(dR, dU, tol_cents=40.0, min_event_sec=0.20):
     # 既存02の縮約版：セント差を算出→連続区間をイベント化
-    tR = np.array([float(p["t"]) for p in dR["track"]], float)
-    fR = np.array([np.nan if p["f0_hz"] is None else float(p["f0_hz"]) for p in dR["track"]], float)
-    tU = np.array([float(p["t"]) for p in dU["track"]], float)
-    fU = np.array([np.nan if p["f0_hz"] is None else float(p["f0_hz"]) for p in dU["track"]], float)
+    tR, fR = extract_track(dR)
+    tU, fU = extract_track(dU)
 
     # 時間合わせ（最近傍）
-    idx = np.searchsorted(tU, tR)
-    idx = np.clip(idx, 1, len(tU)-1)
-    choose = np.where(np.abs(tU[idx-1]-tR) <= np.abs(tU[idx]-tR), idx-1, idx)
-    fU2 = fU[choose]
+    fU2 = fU[align_uniform(tR, tU)]
 
     mask = (~np.isnan(fR)) & (~np.isnan(fU2)) & (fR>0) & (fU2>0)
     cents = np.full_like(fR, np.nan, dtype=float)
@@ -86,42 +85,53 @@ def compare_make_events(dR, dU, tol_cents=40.0, min_event_sec=0.20):
     min_frames = max(1, int(math.ceil(min_event_sec * fps)))
 
     def seg_from_mask(msk):
-        ev=[]
-        s=None
-        for i,flag in enumerate(msk):
-            if flag and s is None: s=i
-            if (not flag or i==len(msk)-1) and s is not None:
-                e = i if not flag else i+1
-                if e - s >= min_frames:
-                    ev.append((s,e))
-                s=None
-        return ev
+        # Python でフレームを1つずつ舐める代わりに、False を前後に足した
+        # 差分で立ち上がり(+1)/立ち下がり(-1)を一括検出する（02 と同じ手法）
+        m = np.concatenate(([False], np.asarray(msk, dtype=bool), [False])).astype(np.int8)
+        d = np.diff(m)
+        starts = np.flatnonzero(d == 1)
+        ends = np.flatnonzero(d == -1)
+        keep = (ends - starts) >= min_frames
+        return starts[keep], ends[keep]
+
+    def seg_stats(starts, ends):
+        """区間ごとの平均・絶対値最大セントを reduceat でまとめて計算する。
+
+        lo/hi の区間内は cents が必ず有限かつ同符号なので、平均の符号を
+        そのまま「|c| 最大の符号付き値」に使える。
+        """
+        bounds = np.ravel(np.column_stack([starts, ends]))
+        if bounds[-1] >= len(cents):
+            bounds = bounds[:-1]
+        sums = np.add.reduceat(cents, bounds)[::2]
+        avg = sums / (ends - starts)
+        vmax = np.maximum.reduceat(cents, bounds)[::2]
+        vmin = np.minimum.reduceat(cents, bounds)[::2]
+        mx = np.where(avg < 0, vmin, vmax)
+        return avg, mx
 
     ev=[]
     # 高すぎ/低すぎ
     hi = cents >  tol_cents
     lo = cents < -tol_cents
-    for s,e in seg_from_mask(lo):
-        seg=cents[s:e]; tr=tR[s:e]
-        ev.append({"start": float(round(tr[0],3)),
-                   "end":   float(round(tr[-1],3)),
-                   "type":  "pitch_low",
-                   "avg_cents": float(round(np.nanmean(seg),1)),
-                   "max_cents": float(round(np.nanmax(np.abs(seg))*np.sign(np.nanmean(seg)),1))})
-    for s,e in seg_from_mask(hi):
-        seg=cents[s:e]; tr=tR[s:e]
-        ev.append({"start": float(round(tr[0],3)),
-                   "end":   float(round(tr[-1],3)),
-                   "type":  "pitch_high",
-                   "avg_cents": float(round(np.nanmean(seg),1)),
-                   "max_cents": float(round(np.nanmax(np.abs(seg))*np.sign(np.nanmean(seg)),1))})
+    for msk, kind in ((lo, "pitch_low"), (hi, "pitch_high")):
+        starts, ends = seg_from_mask(msk)
+        if len(starts) == 0:
+            continue
+        avg, mx = seg_stats(starts, ends)
+        for s, e, a, m in zip(starts.tolist(), ends.tolist(), avg.tolist(), mx.tolist()):
+            ev.append({"start": float(round(tR[s],3)),
+                       "end":   float(round(tR[e-1],3)),
+                       "type":  kind,
+                       "avg_cents": float(round(a,1)),
+                       "max_cents": float(round(m,1))})
 
     # 参照は有声だがユーザー無声
     uv = (~np.isnan(fR)) & (fR>0) & (np.isnan(fU2) | (fU2<=0))
-    for s,e in seg_from_mask(uv):
-        tr=tR[s:e]
-        ev.append({"start": float(round(tr[0],3)),
-                   "end":   float(round(tr[-1],3)),
+    starts, ends = seg_from_mask(uv)
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        ev.append({"start": float(round(tR[s],3)),
+                   "end":   float(round(tR[e-1],3)),
                    "type":  "unvoiced_miss"})
 
     ev.sort(key=lambda x: x["start"])
@@ -138,10 +148,10 @@ def main():
     print(f"autosync shift: {shift_sec:+.3f} sec (score={score:.1f})")
 
     dU_shift = shift_user_pitch(dU, shift_sec)
-    json.dump(dU_shift, open(OUT_SHIFT,"w"), ensure_ascii=False, indent=2)
+    dump_json(dU_shift, OUT_SHIFT, pretty=True)
 
     ev = compare_make_events(dR, dU_shift, tol_cents=40.0, min_event_sec=MIN_DUR)
-    json.dump(ev, open(OUT_EVT,"w"), ensure_ascii=False, indent=2)
+    dump_json(ev, OUT_EVT, pretty=True)
 
     print("wrote:", OUT_SHIFT, "and", OUT_EVT, "events:", len(ev))
 
@@ -1,6 +1,9 @@
 # tools/10_import_lyrics.py
-import os, re, json
+import os, re
 from pathlib import Path
+import numpy as np
+from _json_cache import load_ref_duration
+from _jsonio import dump_json
 
 REF_JSON = os.environ.get("REF_JSON", "SingingApp/analysis/sample01/pitch.json")
 IN_FILE  = os.environ.get("IN_LYRICS", "SingingApp/analysis/sample01/lyrics_input.txt")
@@ -8,74 +11,79 @@ OUT_JSON = os.environ.get("OUT_JSON", "SingingApp/analysis/sample01/lyrics.json"
 
 Path(Path(OUT_JSON).parent).mkdir(parents=True, exist_ok=True)
 
-def load_ref_duration(ref_json):
-    d = json.load(open(ref_json))
-    t = [float(p["t"]) for p in d["track"]]
-    return (t[-1] if t else 0.0)
+# 行ループ内で毎回 re のパターン文字列キャッシュを引かないよう、
+# タイムタグ系の正規表現はモジュールロード時にコンパイルしておく
+_LRC_TAG  = re.compile(r"\[(\d+:\d+(?:\.\d+)?)\]")   # [mm:ss.xx] のタグ部分
+_BRACKETS = re.compile(r"\[.*?\]")                   # タグ除去用
+_NUM      = re.compile(r"\d+")                       # SRT の番号行
+# "[hh:]mm:ss.xx" / "hh:mm:ss,ms" / "ss.x" をまとめて1回で拾う
+_TIME_RE  = re.compile(r"\[?(?:(\d+):)?(?:(\d+):)?(\d+(?:[.,]\d+)?)\]?")
+
+# 総尺の取得は _json_cache.load_ref_duration（.dur サイドカー＋lru）を使う
 
 def parse_time(s):
-    # "mm:ss.xx" / "hh:mm:ss,ms" / "[mm:ss.xx]" などを素朴に拾う
-    s = s.strip().strip("[]")
-    if "," in s: s = s.replace(",", ".")
-    parts = s.split(":")
-    try:
-        if len(parts) == 3:
-            h, m, sec = int(parts[0]), int(parts[1]), float(parts[2])
-            return h*3600 + m*60 + sec
-        elif len(parts) == 2:
-            m, sec = int(parts[0]), float(parts[1])
-            return m*60 + sec
-        else:
-            return float(parts[0])
-    except:
+    # strip/replace/split + try/except の代わりに正規表現1回で分解する
+    m = _TIME_RE.fullmatch(s.strip())
+    if m is None:
         return None
+    h, mn, sec = m.groups()
+    if mn is None:
+        # コロンが1個だけなら mm:ss（最初のグループが分）
+        h, mn = None, h
+    val = float(sec.replace(",", "."))
+    if mn: val += 60.0 * int(mn)
+    if h:  val += 3600.0 * int(h)
+    return val
 
 def read_lrc(lines):
-    res = []
+    times = []; texts = []
     for ln in lines:
         # [mm:ss.xx]歌詞
-        m = re.findall(r"\[(\d+:\d+(?:\.\d+)?)\]", ln)
-        text = re.sub(r"\[.*?\]", "", ln).strip()
+        m = _LRC_TAG.findall(ln)
+        text = _BRACKETS.sub("", ln).strip()
         for tag in m:
             t = parse_time(tag)
             if t is not None and text:
-                res.append((t, text))
-    res.sort()
+                times.append(t); texts.append(text)
+    if not times:
+        return []
+    # LRC はほぼ時刻順なので、タプル比較の Python ソートではなく
+    # 時刻配列だけを C 実装の安定マージソートで並べ替える
+    # （同時刻のタグはファイル内の出現順を保つ）
+    ts = np.asarray(times)
+    order = np.argsort(ts, kind="stable")
+    st_sorted = ts[order]
     # end は次行の start、最後は+3秒（仮）
     out = []
-    for i,(st,tx) in enumerate(res):
-        en = res[i+1][0] if i+1 < len(res) else st + 3.0
-        out.append({"start": round(st,3), "end": round(en,3), "text": tx})
+    n = len(order)
+    for k in range(n):
+        st = float(st_sorted[k])
+        en = float(st_sorted[k+1]) if k+1 < n else st + 3.0
+        out.append({"start": round(st,3), "end": round(en,3), "text": texts[order[k]]})
     return out
 
 def read_srt(lines):
     # 1)
     # 00:00:12,000 --> 00:00:15,000
     # 歌詞
-    out = []
-    block = []
-    for ln in lines:
-        if ln.strip():
-            block.append(ln.rstrip("\n"))
-        else:
-            if block: out.append(block); block=[]
-    if block: out.append(block)
+    # ブロックのリストを作ってから二周せず、空行でその場で確定する1パス版
     rows = []
-    for b in out:
-        times = None
-        text  = []
-        for ln in b:
-            if "-->" in ln:
-                a,b = ln.split("-->")
-                st = parse_time(a.strip())
-                en = parse_time(b.strip())
-                times = (st,en)
-            else:
-                # 番号行は飛ばす
-                if re.fullmatch(r"\d+", ln.strip()): continue
-                text.append(ln.strip())
-        if times and text:
-            rows.append({"start": round(times[0],3), "end": round(times[1],3), "text": " ".join(text)})
+    times = None
+    text = []
+    for ln in lines:
+        s = ln.strip()
+        if not s:
+            if times and text:
+                rows.append({"start": round(times[0],3), "end": round(times[1],3), "text": " ".join(text)})
+            times = None; text = []
+        elif "-->" in s:
+            a, b = s.split("-->")
+            times = (parse_time(a.strip()), parse_time(b.strip()))
+        elif not _NUM.fullmatch(s):
+            # 番号行は飛ばす
+            text.append(s)
+    if times and text:
+        rows.append({"start": round(times[0],3), "end": round(times[1],3), "text": " ".join(text)})
     return rows
 
 def read_txt(lines, total_sec):
@@ -93,30 +101,32 @@ def read_txt(lines, total_sec):
         out.append({"start": round(st,3), "end": round(en,3), "text": tx})
     return out
 
-def detect_format(path):
-    p = Path(path)
-    ext = p.suffix.lower()
-    if ext in [".lrc", ".srt", ".txt"]:
+# 拡張子→リーダーの固定テーブル（read_txt だけ総尺を使うので引数を揃える）
+_EXT_OK  = frozenset((".lrc", ".srt", ".txt"))
+_READERS = {
+    ".lrc": lambda lines, total: read_lrc(lines),
+    ".srt": lambda lines, total: read_srt(lines),
+    ".txt": read_txt,
+}
+
+def detect_format(path, head):
+    ext = Path(path).suffix.lower()
+    if ext in _EXT_OK:
         return ext
-    # 拡張子なしでも行を覗いて判定
-    head = "".join(open(path, encoding="utf-8", errors="ignore").readlines()[:5])
+    # 拡張子なしでも先頭を覗いて判定（本文は main が1回読んだものを使い回す）
     if "[" in head and "]" in head: return ".lrc"
     if "-->" in head: return ".srt"
     return ".txt"
 
 def main():
     total = load_ref_duration(REF_JSON)
-    fmt = detect_format(IN_FILE)
-    lines = open(IN_FILE, encoding="utf-8", errors="ignore").read().splitlines()
-
-    if fmt == ".lrc":
-        rows = read_lrc(lines)
-    elif fmt == ".srt":
-        rows = read_srt(lines)
-    else:
-        rows = read_txt(lines, total)
+    # 判定用と本文用に2回 open/decode しない：1回読んで両方に使う
+    raw = Path(IN_FILE).read_text(encoding="utf-8", errors="ignore")
+    lines = raw.splitlines()
+    fmt = detect_format(IN_FILE, "\n".join(lines[:5]))
+    rows = _READERS[fmt](lines, total)
 
-    json.dump({"lyrics": rows}, open(OUT_JSON,"w"), ensure_ascii=False, indent=2)
+    dump_json({"lyrics": rows}, OUT_JSON, pretty=True)
     print("wrote:", OUT_JSON, "items:", len(rows), "format:", fmt)
 
 if __name__ == "__main__":
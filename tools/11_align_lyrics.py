@@ -1,7 +1,15 @@
 # tools/11_align_lyrics.py
-import os, json, math
+import os, math
 from pathlib import Path
 import numpy as np
+from _json_cache import load_json_cached
+from _jsonio import dump_json
+from _pitchlib import load_pitch
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 REF_JSON  = os.environ.get("REF_JSON",  "SingingApp/analysis/sample01/pitch.json")
 IN_JSON   = os.environ.get("IN_JSON",   "SingingApp/analysis/sample01/lyrics.json")
@@ -12,34 +20,23 @@ MIN_DUR   = float(os.environ.get("MIN_DUR","0.40"))   # 各フレーズの最小
 
 Path(Path(OUT_JSON).parent).mkdir(parents=True, exist_ok=True)
 
-def load_pitch(path):
-    d = json.load(open(path, encoding="utf-8"))
-    t = np.array([float(x["t"]) for x in d.get("track", [])], dtype=float)
-    f = np.array([np.nan if x.get("f0_hz") is None else float(x["f0_hz"]) for x in d.get("track", [])], dtype=float)
-    return t, f, int(d.get("sr", 44100)), int(d.get("hop", 256))
-
 def voiced_segments(t, f, gap_sec=0.60):
     """簡易な有声区間抽出（NaN/0以外が続く場所をまとめる）。"""
     if t.size == 0 or f.size == 0:
         return []
     mask = (~np.isnan(f)) & (f > 0)
-    idx = np.where(mask)[0]
-    if idx.size == 0:
+    # 有声インデックスを Python で1つずつ比較する代わりに、マスクの
+    # 立ち上がり(+1)/立ち下がり(-1)を差分で一括検出する
+    d = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    starts_i = np.where(d == 1)[0]
+    if starts_i.size == 0:
         return []
-    starts = [idx[0]]; ends = []
-    for a, b in zip(idx, idx[1:]):
-        if b != a + 1:
-            ends.append(a); starts.append(b)
-    ends.append(idx[-1])
-    segs = [(float(t[s]), float(t[e])) for s, e in zip(starts, ends)]
-
-    # 最小長保証
-    fixed = []
-    for s, e in segs:
-        if e - s < MIN_DUR:
-            e = s + MIN_DUR
-        fixed.append((s, e))
-    return fixed
+    ends_i = np.where(d == -1)[0] - 1
+
+    # 最小長保証もベクトルで（e < s+MIN_DUR の区間を引き伸ばす）
+    s = t[starts_i]
+    e = np.maximum(t[ends_i], s + MIN_DUR)
+    return list(zip(s.tolist(), e.tolist()))
 
 def detect_input_rows(raw):
     """
@@ -93,6 +90,51 @@ def assign_from_timed(rows, total_end):
         out.append({"start": round(s, 3), "end": round(e, 3), "text": r["text"]})
     return out
 
+def _merge_core(starts, ends, n_lines, min_dur):
+    """セグメントが歌詞行より多いときのマージ本体（float64 配列上のループ）。
+
+    タプルのリストを pop/insert で組み替える代わりに固定長バッファを
+    インデックスで操作する。numba が入っていればこのままコンパイルされる。
+    """
+    n = starts.shape[0]
+    out_s = np.empty(n, np.float64)
+    out_e = np.empty(n, np.float64)
+    m = 0
+
+    # マージ：長さにあまり依らない素朴版（均等寄せ）
+    ratio = n / n_lines
+    acc = 0.0
+    bag_start = 0.0
+    have = False
+    for i in range(n):
+        if not have:
+            bag_start = starts[i]
+            have = True
+        acc += 1.0
+        if acc >= ratio or i == n - 1:
+            s = bag_start
+            e = ends[i]
+            if e - s < min_dur:
+                e = s + min_dur
+            out_s[m] = s; out_e[m] = e; m += 1
+            have = False; acc = 0.0
+    # 数ズレ微調整（末尾2つを畳む／末尾を二等分）
+    while m > n_lines:
+        out_e[m - 2] = out_e[m - 1]
+        m -= 1
+    while m < n_lines:
+        s = out_s[m - 1]; e = out_e[m - 1]
+        mid = (s + e) / 2.0
+        out_e[m - 1] = mid
+        out_s[m] = mid; out_e[m] = e
+        m += 1
+    return out_s, out_e, m
+
+
+if njit is not None:
+    _merge_core = njit(cache=True)(_merge_core)
+
+
 def split_or_merge(segs, n_lines):
     """セグメント数と歌詞行数を合わせる（多ければマージ、少なければ等分分割）。"""
     if n_lines <= 0:
@@ -105,45 +147,36 @@ def split_or_merge(segs, n_lines):
     if len(segs) == n_lines:
         return segs
 
-    lens = [e - s for s, e in segs]
-    total = sum(lens)
+    starts = np.fromiter((s for s, _ in segs), dtype=np.float64, count=len(segs))
+    ends   = np.fromiter((e for _, e in segs), dtype=np.float64, count=len(segs))
 
     if len(segs) > n_lines:
-        # マージ：長さにあまり依らない素朴版（均等寄せ）
-        ratio = len(segs) / n_lines
-        out, bag = [], []
-        acc = 0.0
-        for i, seg in enumerate(segs):
-            bag.append(seg); acc += 1.0
-            if acc >= ratio or i == len(segs) - 1:
-                s = bag[0][0]; e = bag[-1][1]
-                if e - s < MIN_DUR:
-                    e = s + MIN_DUR
-                out.append((s, e))
-                bag = []; acc = 0.0
-        # 数ズレ微調整
-        while len(out) > n_lines:
-            a = out.pop(); b = out.pop()
-            out.append((b[0], a[1]))
-        while len(out) < n_lines:
-            s, e = out[-1]
-            m = (s + e) / 2
-            out[-1] = (s, m); out.append((m, e))
-        return out
-    else:
-        # 分割
-        out = []
-        for s, e in segs:
+        out_s, out_e, m = _merge_core(starts, ends, n_lines, MIN_DUR)
+        return list(zip(out_s[:m].tolist(), out_e[:m].tolist()))
+
+    # 分割：以前は「一番長い区間を二等分」を足りるまで繰り返していた（O(n²)の
+    # pop/insert）。区間長に比例した本数を一度に割り当て、linspace で切る
+    lens = ends - starts
+    quotas = np.maximum(1, np.rint(lens / lens.sum() * n_lines).astype(np.intp))
+    diff = n_lines - int(quotas.sum())
+    if diff > 0:
+        # 丸めの不足分は一番長い区間に寄せる
+        quotas[int(np.argmax(lens))] += diff
+    while diff < 0:
+        # 超過分は quota>1 の長い区間から順に返す
+        j = int(np.argmax(np.where(quotas > 1, lens, -np.inf)))
+        take = min(int(quotas[j]) - 1, -diff)
+        quotas[j] -= take
+        diff += take
+
+    out = []
+    for (s, e), q in zip(segs, quotas.tolist()):
+        if q == 1:
             out.append((s, e))
-        # 足りない分を長い区間から割る
-        while len(out) < n_lines:
-            # 一番長い区間を二等分
-            idx = max(range(len(out)), key=lambda i: out[i][1] - out[i][0])
-            s, e = out.pop(idx)
-            m = (s + e) / 2
-            out.insert(idx, (s, m))
-            out.insert(idx + 1, (m, e))
-        return out[:n_lines]
+        else:
+            grid = np.linspace(s, e, q + 1)
+            out.extend(zip(grid[:-1].tolist(), grid[1:].tolist()))
+    return out
 
 def main():
     # 参照ピッチから総尺と有声セグメントを拾う
@@ -151,7 +184,8 @@ def main():
     total_end = float(tR[-1]) if tR.size else 0.0
     segs = voiced_segments(tR, fR, GAP_SEC)
 
-    raw = json.load(open(IN_JSON, encoding="utf-8"))
+    # 同一プロセスでパイプラインを回すランナー向けに mtime キーの lru 経由で読む
+    raw = load_json_cached(IN_JSON)
     # {"lines":[...]} / {"lyrics":[...]} 両対応
     rows = detect_input_rows(raw)
 
@@ -175,8 +209,13 @@ def main():
                             "end":   round(float(e), 3),
                             "text":  r["text"]})
 
-    out = {"source": raw.get("source", "lyrics_input"), "lines": aligned}
-    json.dump(out, open(OUT_JSON, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+    # pitch.json と同じく列指向で書く（行ごとの dict を繰り返すとキー文字列が
+    # 行数分重複してパースも遅い）。読み手（12など）は旧 "lines" 形式も受ける
+    out = {"source": raw.get("source", "lyrics_input"),
+           "starts": [r["start"] for r in aligned],
+           "ends":   [r["end"]   for r in aligned],
+           "texts":  [r["text"]  for r in aligned]}
+    dump_json(out, OUT_JSON, pretty=True)
     print("wrote:", OUT_JSON, "lines:", len(aligned))
 
 if __name__ == "__main__":
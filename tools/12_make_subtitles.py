@@ -1,66 +1,76 @@
 # tools/12_make_subtitles.py  （置き換え版）
-import os, json
+import os
 from pathlib import Path
+from _json_cache import load_json_cached
+from _jsonio import dump_json
 
 IN_JSON = os.environ.get("IN_JSON", "SingingApp/analysis/sample01/lyrics_aligned.json")
 OUT_DIR = os.environ.get("OUT_DIR", "SingingApp/analysis/sample01")
 
 def _sec_to_timestamp_srt(sec: float) -> str:
-    # 00:MM:SS,ms（SRT）
-    ms = int(round((sec - int(sec)) * 1000))
-    sec = int(sec)
-    hh = sec // 3600
-    mm = (sec % 3600) // 60
-    ss = sec % 60
+    # 00:MM:SS,ms（SRT）。総ミリ秒に丸めてから divmod で桁分解する
+    # （小数部だけ丸める旧実装は 0.9995 秒などで ms=1000 になり得た）
+    ss, ms = divmod(int(sec * 1000 + 0.5), 1000)
+    mm, ss = divmod(ss, 60)
+    hh, mm = divmod(mm, 60)
     return f"{hh:02d}:{mm:02d}:{ss:02d},{ms:03d}"
 
 def _sec_to_timestamp_lrc(sec: float) -> str:
-    # [MM:SS.xx]（LRC）
-    sec_int = int(sec)
-    mm = sec_int // 60
-    ss = sec_int % 60
-    xx = int(round((sec - sec_int) * 100))  # 小数2桁
+    # [MM:SS.xx]（LRC）。同じく総センチ秒からの divmod
+    ss, xx = divmod(int(sec * 100 + 0.5), 100)
+    mm, ss = divmod(ss, 60)
     return f"[{mm:02d}:{ss:02d}.{xx:02d}]"
 
-def _load_lines(path: Path):
-    d = json.loads(path.read_text(encoding="utf-8"))
-    # どちらのキーにも対応
+def _load_columns(path: Path):
+    """starts/ends/texts の3列に展開して返す（float化と text 補正はここで1回だけ）。
+
+    以前は各ライターが行 dict から float(r["start"]) / r.get("text") を
+    やり直していたので、同じ変換を3パス繰り返していた。
+    """
+    # 11 が書いた直後に読むファイルなので、同一プロセスなら lru 命中で再パースなし
+    d = load_json_cached(path)
+    if "starts" in d:
+        # 列指向形式（11 が出力する {"starts":[...], "ends":[...], "texts":[...]}）
+        starts = [float(s) for s in d["starts"]]
+        ends   = [float(e) for e in d["ends"]]
+        texts  = [(tx or "").strip() for tx in d["texts"]]
+        return starts, ends, texts
+    # 旧行指向：どちらのキーにも対応
     rows = d.get("lines") or d.get("lyrics") or []
-    # shape: [{"start": float, "end": float, "text": str}, ...]
-    return rows
+    starts = []; ends = []; texts = []
+    for r in rows:
+        starts.append(float(r["start"]))
+        ends.append(float(r["end"]))
+        texts.append((r.get("text") or "").strip())
+    return starts, ends, texts
 
-def _write_srt(rows, out_path: Path):
-    out = []
-    for i, r in enumerate(rows, start=1):
-        a = _sec_to_timestamp_srt(float(r["start"]))
-        b = _sec_to_timestamp_srt(float(r["end"]))
-        t = (r.get("text") or "").strip()
-        out.append(str(i))
-        out.append(f"{a} --> {b}")
-        out.append(t if t else " ")
-        out.append("")  # 空行
-    out_path.write_text("\n".join(out), encoding="utf-8")
+def _write_srt(starts, ends, texts, out_path: Path):
+    # 行ごとの append 4連発をやめ、1ブロック=1文字列の生成式をまとめて join
+    blocks = (
+        f"{i}\n"
+        f"{_sec_to_timestamp_srt(s)} --> {_sec_to_timestamp_srt(e)}\n"
+        f"{t or ' '}\n"
+        for i, (s, e, t) in enumerate(zip(starts, ends, texts), start=1)
+    )
+    out_path.write_text("\n".join(blocks), encoding="utf-8")
 
-def _write_lrc(rows, out_path: Path):
-    out = []
-    for r in rows:
-        tag = _sec_to_timestamp_lrc(float(r["start"]))
-        t = (r.get("text") or "").strip()
-        out.append(f"{tag}{t}")
-    out_path.write_text("\n".join(out) + "\n", encoding="utf-8")
+def _write_lrc(starts, texts, out_path: Path):
+    out_path.write_text(
+        "".join(f"{_sec_to_timestamp_lrc(s)}{t}\n" for s, t in zip(starts, texts)),
+        encoding="utf-8")
 
-def _write_overlay_json(rows, out_path: Path):
-    # 軽量オーバーレイ（UI重ね表示用）
-    simple = [{"s": float(r["start"]), "e": float(r["end"]), "t": r.get("text","")} for r in rows]
-    out_path.write_text(json.dumps(simple, ensure_ascii=False, indent=2), encoding="utf-8")
+def _write_overlay_json(starts, ends, texts, out_path: Path):
+    # 軽量オーバーレイ（UI重ね表示用）。機械しか読まないのでコンパクトに書く
+    simple = [{"s": s, "e": e, "t": t} for s, e, t in zip(starts, ends, texts)]
+    dump_json(simple, out_path)
 
 def main():
     in_path = Path(IN_JSON)
     out_dir = Path(OUT_DIR)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    rows = _load_lines(in_path)
-    if not rows:
+    starts, ends, texts = _load_columns(in_path)
+    if not starts:
         raise SystemExit(f"No lyrics rows in: {in_path}")
 
     # 出力ファイル
@@ -70,11 +80,12 @@ def main():
     out_json_copy = out_dir / "lyrics.json"  # 元JSONも持っておく
 
     # 書き出し
-    _write_lrc(rows, out_lrc)
-    _write_srt(rows, out_srt)
-    _write_overlay_json(rows, out_overlay)
+    _write_lrc(starts, texts, out_lrc)
+    _write_srt(starts, ends, texts, out_srt)
+    _write_overlay_json(starts, ends, texts, out_overlay)
     # 元JSONをコピー（lines/lyrics どちらでもOKなラッパーで揃える）
-    out_json_copy.write_text(json.dumps({"lines": rows}, ensure_ascii=False, indent=2), encoding="utf-8")
+    rows = [{"start": s, "end": e, "text": t} for s, e, t in zip(starts, ends, texts)]
+    dump_json({"lines": rows}, out_json_copy, pretty=True)
 
     print("wrote:", out_lrc, out_srt, out_overlay, out_json_copy, "items:", len(rows))
 
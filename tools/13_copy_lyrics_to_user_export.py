@@ -1,5 +1,5 @@
 # 13_copy_lyrics_to_user_export.py
-import os, json
+import os, shutil
 from pathlib import Path
 
 # ルート（…/SingingTrainerApp/SingingApp）
@@ -46,14 +46,16 @@ export_dir.mkdir(parents=True, exist_ok=True)
 dst_user   = user_dir   / "lyrics.json"
 dst_export = export_dir / "lyrics.json"
 
-with open(src, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-with open(dst_user, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
-
-with open(dst_export, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
+# 中身はそのままのコピーなので JSON をパースし直す必要はない。
+# 09 の export と同じく、可能ならハードリンクで0バイトコピーする
+# （user/ と export/ は base 直下なので通常は同一ファイルシステム）
+for dst in (dst_user, dst_export):
+    try:
+        if dst.exists():
+            dst.unlink()
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 print("copied:")
 print(" -", src, "→", dst_user)
@@ -1,63 +1,79 @@
 # SingingApp/tools/14_import_lyrics_v2.py
-import os, re, json
+import os, re
 from pathlib import Path
-from _song_paths import get_song_id, paths
+import numpy as np
+from _song_paths import get_song_id, ensure_dirs
+from _json_cache import load_ref_duration
+from _jsonio import dump_json
+
+# 行ループ内で毎回 re のパターン文字列キャッシュを引かないよう、
+# タイムタグ系の正規表現はモジュールロード時にコンパイルしておく
+_LRC_TAG    = re.compile(r"\[(\d+:\d+(?:\.\d+)?)\]")   # [mm:ss.xx] のタグ部分
+_BRACKETS   = re.compile(r"\[.*?\]")                     # タグ除去用
+_NUM        = re.compile(r"\d+")                          # SRT の番号行
+_LRC_DETECT = re.compile(r"\[\d+:\d+(?:\.\d+)?\]")      # 形式判定用
+# "[hh:]mm:ss.xx" / "hh:mm:ss,ms" / "ss.x" をまとめて1回で拾う
+_TIME_RE    = re.compile(r"\[?(?:(\d+):)?(?:(\d+):)?(\d+(?:[.,]\d+)?)\]?")
 
 def parse_time(s):
-    s = s.strip().strip("[]").replace(",", ".")
-    parts = s.split(":")
-    try:
-        if len(parts) == 3:
-            h,m,sec = int(parts[0]), int(parts[1]), float(parts[2])
-            return h*3600 + m*60 + sec
-        elif len(parts) == 2:
-            m,sec = int(parts[0]), float(parts[1])
-            return m*60 + sec
-        else:
-            return float(parts[0])
-    except:
+    # strip/replace/split + try/except の代わりに正規表現1回で分解する（10 と同じ）
+    m = _TIME_RE.fullmatch(s.strip())
+    if m is None:
         return None
+    h, mn, sec = m.groups()
+    if mn is None:
+        # コロンが1個だけなら mm:ss（最初のグループが分）
+        h, mn = None, h
+    val = float(sec.replace(",", "."))
+    if mn: val += 60.0 * int(mn)
+    if h:  val += 3600.0 * int(h)
+    return val
 
 def detect_format(text_head):
-    if re.search(r"\[\d+:\d+(?:\.\d+)?\]", text_head): return "lrc"
+    if _LRC_DETECT.search(text_head): return "lrc"
     if "-->" in text_head: return "srt"
     return "txt"
 
 def read_lrc(lines):
-    res=[]
+    times=[]; texts=[]
     for ln in lines:
-        tags = re.findall(r"\[(\d+:\d+(?:\.\d+)?)\]", ln)
-        text = re.sub(r"\[.*?\]", "", ln).strip()
+        tags = _LRC_TAG.findall(ln)
+        text = _BRACKETS.sub("", ln).strip()
         for t in tags:
             tt = parse_time(t)
             if tt is not None and text:
-                res.append((tt, text))
-    res.sort()
+                times.append(tt); texts.append(text)
+    if not times:
+        return []
+    # 時刻配列だけを C 実装の安定マージソートで並べ替える（10 と同じ）
+    ts = np.asarray(times)
+    order = np.argsort(ts, kind="stable")
+    st_sorted = ts[order]
     out=[]
-    for i,(st,tx) in enumerate(res):
-        en = res[i+1][0] if i+1<len(res) else st+3.0
-        out.append({"start": round(st,3), "end": round(en,3), "text": tx})
+    n = len(order)
+    for k in range(n):
+        st = float(st_sorted[k])
+        en = float(st_sorted[k+1]) if k+1<n else st+3.0
+        out.append({"start": round(st,3), "end": round(en,3), "text": texts[order[k]]})
     return out
 
 def read_srt(lines):
-    blocks=[]; buf=[]
-    for ln in lines:
-        if ln.strip(): buf.append(ln.rstrip("\n"))
-        else:
-            if buf: blocks.append(buf); buf=[]
-    if buf: blocks.append(buf)
+    # 中間の blocks リストを作らず、空行でその場でブロックを確定する1パス版
     out=[]
-    for b in blocks:
-        st=en=None; texts=[]
-        for ln in b:
-            if "-->" in ln:
-                a,b = ln.split("-->")
-                st, en = parse_time(a.strip()), parse_time(b.strip())
-            else:
-                if not re.fullmatch(r"\d+", ln.strip()):
-                    texts.append(ln.strip())
-        if st is not None and en is not None and texts:
-            out.append({"start": round(st,3), "end": round(en,3), "text":" ".join(texts)})
+    st=en=None; texts=[]
+    for ln in lines:
+        s = ln.strip()
+        if not s:
+            if st is not None and en is not None and texts:
+                out.append({"start": round(st,3), "end": round(en,3), "text":" ".join(texts)})
+            st=en=None; texts=[]
+        elif "-->" in s:
+            a,b = s.split("-->")
+            st, en = parse_time(a.strip()), parse_time(b.strip())
+        elif not _NUM.fullmatch(s):
+            texts.append(s)
+    if st is not None and en is not None and texts:
+        out.append({"start": round(st,3), "end": round(en,3), "text":" ".join(texts)})
     return out
 
 def read_txt(lines, total_sec):
@@ -74,15 +90,19 @@ def read_txt(lines, total_sec):
     return out
 
 def load_ref_total_sec(ref_pitch_json: Path) -> float:
-    if ref_pitch_json.exists():
-        d=json.load(open(ref_pitch_json, encoding="utf-8"))
-        t=[float(p["t"]) for p in d.get("track",[])]
-        return t[-1] if t else 0.0
-    return 0.0
+    # .dur サイドカー＋プロセス内 lru 付きの共通実装に委譲する
+    return load_ref_duration(ref_pitch_json)
+
+# 形式→リーダーの固定テーブル（read_txt だけ総尺を使うので引数を揃える）
+_READERS = {
+    "lrc": lambda lines, total: read_lrc(lines),
+    "srt": lambda lines, total: read_srt(lines),
+    "txt": read_txt,
+}
 
 def main():
     song = os.environ.get("SONG", "sample01")
-    p = paths(song)
+    p = ensure_dirs(song)
     ref_pitch    = p["files"]["ref_pitch"]
     lyrics_input = p["files"]["ref_lyrics_input"]
     out_json     = p["files"]["ref_lyrics"]
@@ -91,19 +111,15 @@ def main():
     if not lyrics_input.exists():
         raise SystemExit(f"lyrics_input がありません: {lyrics_input}")
 
-    head  = "".join(open(lyrics_input, encoding="utf-8", errors="ignore").readlines()[:5])
-    fmt   = detect_format(head)
-    lines = open(lyrics_input, encoding="utf-8", errors="ignore").read().splitlines()
+    # 判定用と本文用に2回 open/decode しない：1回読んで両方に使う
+    raw   = lyrics_input.read_text(encoding="utf-8", errors="ignore")
+    lines = raw.splitlines()
+    fmt   = detect_format("\n".join(lines[:5]))
     total = load_ref_total_sec(ref_pitch)
 
-    if fmt=="lrc":
-        rows = read_lrc(lines)
-    elif fmt=="srt":
-        rows = read_srt(lines)
-    else:
-        rows = read_txt(lines, total)
+    rows = _READERS[fmt](lines, total)
 
-    json.dump({"lyrics": rows}, open(out_json,"w"), ensure_ascii=False, indent=2)
+    dump_json({"lyrics": rows}, out_json, pretty=True)
     print(f"[{song}] wrote:", out_json, "items:", len(rows), "format:", fmt)
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+# tools/_json_cache.py
+# 歌詞系ツール（10〜14）共通の軽量 JSON キャッシュ。
+# パイプライン1回の中で同じ pitch.json を何度もパースしないための
+# プロセス内 lru と、総尺だけを書き残す .dur サイドカーを提供する。
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from _jsonio import load_json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+@lru_cache(maxsize=32)
+def _load_json_keyed(path_str, _mtime):
+    # mtime をキーに含めることで、ファイル更新後の呼び出しは別エントリになる
+    return load_json(path_str)
+
+
+def load_json_cached(path):
+    """path の JSON を読む。同一 mtime の再読込はプロセス内キャッシュで返す。"""
+    p = str(path)
+    return _load_json_keyed(p, os.path.getmtime(p))
+
+
+def load_ref_duration(path) -> float:
+    """pitch.json の最終フレーム時刻（≒総尺秒）を返す。ファイルが無ければ 0.0。
+
+    総尺しか要らないツールのために、最終 t を1行書いただけの .dur
+    サイドカーを使う。新しいサイドカーがあれば stat+read だけで済み、
+    無ければ JSON をパースして書き残す（読み取り専用の場所では素通し）。
+    """
+    p = Path(path)
+    if not p.exists():
+        return 0.0
+    dur_path = p.with_suffix(p.suffix + ".dur")
+    try:
+        if dur_path.stat().st_mtime >= p.stat().st_mtime:
+            return float(dur_path.read_text())
+    except (OSError, ValueError):
+        pass
+
+    if ijson is not None:
+        # ijson があればインクリメンタルに舐めて「最後の t」だけ保持する。
+        # dict もリストも実体化しないのでピークメモリは O(1)
+        last = None
+        with p.open("rb") as f:
+            for prefix, event, value in ijson.parse(f):
+                if event == "number" and prefix in ("track.item.t", "t.item"):
+                    last = value
+        total = float(last) if last is not None else 0.0
+    else:
+        d = load_json_cached(p)
+        if "track" in d:
+            tr = d["track"]
+            total = float(tr[-1]["t"]) if tr else 0.0
+        else:
+            # 列指向形式（01 が出力する {"t":[...], ...}）
+            t = d.get("t", [])
+            total = float(t[-1]) if len(t) else 0.0
+
+    try:
+        dur_path.write_text(f"{total:.6f}\n")
+    except OSError:
+        pass
+    return total
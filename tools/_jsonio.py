@@ -0,0 +1,141 @@
+# tools/_jsonio.py
+# ツール共通の JSON 入出力ヘルパー。
+# orjson が入っていれば Rust 実装でパース/シリアライズし（数値だらけの
+# pitch.json で数倍速い）、無ければ stdlib json にフォールバックする。
+# numpy 配列・スカラーは orjson 経路ではそのまま渡せる。
+import json
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+    _simd_parser = simdjson.Parser()
+except ImportError:
+    simdjson = None
+
+
+def load_json(path):
+    """path の JSON を読み込んで Python オブジェクトで返す。"""
+    p = Path(path)
+    if orjson is not None:
+        return orjson.loads(p.read_bytes())
+    with p.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _extract_track(d):
+    """パース済み pitch オブジェクトから (t, f0) を取り出す（旧行指向/新列指向の両対応）。
+
+    d は dict でも pysimdjson の遅延ビューでもよい。行指向では確保済み
+    配列へ直接書き込み、フレームごとの中間リストを作らない。
+    """
+    if "track" in d:
+        tr = d["track"]
+        t = np.empty(len(tr), dtype=np.float64)
+        f = np.empty(len(tr), dtype=np.float64)
+        for i, x in enumerate(tr):
+            t[i] = x["t"]
+            v = x["f0_hz"] if "f0_hz" in x else None
+            f[i] = np.nan if v is None else v
+    else:
+        t = np.fromiter(d["t"], dtype=np.float64, count=len(d["t"]))
+        f = np.fromiter((np.nan if v is None else v for v in d["f0_hz"]),
+                        dtype=np.float64, count=len(t))
+    return t, f
+
+
+_I16_MIN = np.iinfo(np.int16).min
+
+
+def _sidecar_load(npz_path):
+    """01 形式の .npz サイドカーを mmap で読み、(t, f0, sr, hop) に展開する。"""
+    d = np.load(npz_path, mmap_mode="r")
+    t = np.asarray(d["t"], dtype=np.float64)
+    if "cents_a4" in d:
+        # int16「A4(440Hz) からのセント差」形式（無声は int16 最小値の番兵）
+        c = np.asarray(d["cents_a4"])
+        f = np.where(c == _I16_MIN, np.nan,
+                     440.0 * np.exp2(np.asarray(c, dtype=np.float64) / 1200.0))
+    else:
+        f = np.asarray(d["f0"], dtype=np.float64)  # 旧サイドカー（float32 Hz）
+    return t, f, int(d["sr"]), int(d["hop"])
+
+
+def _sidecar_save(npz_path, t, f, sr, hop):
+    """パース結果を 01 と同じ .npz 形式で書き、次回以降の JSON パースを省く。"""
+    voiced = ~np.isnan(f)
+    cents_a4 = np.full(len(f), _I16_MIN, dtype=np.int16)
+    cents_a4[voiced] = np.round(1200.0 * np.log2(f[voiced] / 440.0)).astype(np.int16)
+    np.savez(npz_path, t=t.astype(np.float32), cents_a4=cents_a4,
+             sr=np.int64(sr), hop=np.int64(hop))
+
+
+def load_pitch_arrays(path):
+    """pitch.json から (t, f0, sr, hop) を直接抽出する。
+
+    01 が書く .npz サイドカーがあれば JSON パースを丸ごと飛ばして mmap で
+    読む。無ければパースしたうえでサイドカーを書き残すので、同じ参照
+    トラックを読む後続ツール（05/06/08 など）は2回目以降キャッシュ命中になる。
+    パース自体は pysimdjson があれば遅延ビュー（SIMD パース）のまま配列へ
+    流し込み、フレームごとの dict を Python 側に実体化しない。
+    """
+    npz_path = Path(path).with_suffix(".npz")
+    if npz_path.exists() and npz_path.stat().st_mtime >= Path(path).stat().st_mtime:
+        return _sidecar_load(npz_path)
+
+    if simdjson is not None:
+        d = _simd_parser.parse(Path(path).read_bytes())
+    else:
+        d = load_json(path)
+    t, f = _extract_track(d)
+    sr = int(d["sr"]) if "sr" in d else 44100
+    hop = int(d["hop"]) if "hop" in d else 256
+    try:
+        _sidecar_save(npz_path, t, f, sr, hop)
+    except OSError:
+        pass  # 読み取り専用ディレクトリ等ではキャッシュせず素通し
+    return t, f, sr, hop
+
+
+def _np_default(o):
+    # stdlib フォールバック用：numpy 配列/スカラーは tolist()/item() で素の型に落とす
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """obj をコンパクトな JSON バイト列で返す（圧縮前段などファイルを経ない用途向け）。"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"),
+                      default=_np_default).encode("utf-8")
+
+
+def dump_json(obj, path, *, pretty=False):
+    """obj を path へ一括書き出しする。pretty=True で人が読む用の indent=2。
+
+    numpy 配列はそのまま渡してよい（orjson は OPT_SERIALIZE_NUMPY、
+    stdlib は default フックで変換する）。
+    """
+    p = Path(path)
+    if orjson is not None:
+        opt = orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            opt |= orjson.OPT_INDENT_2
+        p.write_bytes(orjson.dumps(obj, option=opt))
+        return
+    # stdlib でもストリーム書き（細かい write の連打＋改行変換）はせず、
+    # 一度バイト列にしてから write 1回で書く
+    if pretty:
+        data = json.dumps(obj, ensure_ascii=False, indent=2, default=_np_default)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, separators=(",", ":"),
+                          default=_np_default)
+    p.write_bytes(data.encode("utf-8"))
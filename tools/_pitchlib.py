@@ -0,0 +1,65 @@
+# tools/_pitchlib.py
+# ピッチ配列まわりの共有ヘルパー。04/05/06/08 が個別に持っていた
+# 最近傍アライメントとセント差計算をここに一本化する（読み込みは
+# _jsonio.load_pitch_arrays の再輸出）。1箇所にまとまっていれば、
+# JIT やサイドカーキャッシュなどの最適化も全ツールに一度で効く。
+import numpy as np
+
+from _jsonio import load_pitch_arrays as load_pitch
+from _jsonio import _extract_track as extract_track
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+def align_uniform(t_ref, t_usr):
+    """t_ref の各時刻に一番近い t_usr のインデックスを返す。
+
+    フレームは hop/sr の等間隔グリッドなので、格子が一様なら丸め1回で
+    最近傍が出る（二分探索も比較用の中間配列も不要）。非一様グリッドは
+    searchsorted + 近傍比較のフォールバックで処理する。
+    """
+    n = len(t_usr)
+    if n == 1:
+        # 1フレームしか無いトラックは全参照時刻をその1点に割り当てる
+        # （フォールバックの clip(idx, 1, …) が範囲外を指してしまう）
+        return np.zeros(len(t_ref), dtype=np.intp)
+    if n > 1 and float(np.ptp(np.diff(t_usr))) <= 1e-4:
+        fps = (n - 1) / float(t_usr[-1] - t_usr[0])
+        idx = np.rint((t_ref - t_usr[0]) * fps).astype(np.intp)
+        return np.clip(idx, 0, n - 1)
+    idx = np.searchsorted(t_usr, t_ref)
+    idx = np.clip(idx, 1, max(1, n - 1))
+    return np.where(np.abs(t_usr[idx-1]-t_ref) <= np.abs(t_usr[idx]-t_ref), idx-1, idx)
+
+
+if njit is not None:
+    # マスク判定と log2 を1パスに融合するカーネル。
+    # NumPy 版はマスク・比・log の一時配列を3本作るので、長尺ではこちらが有利
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cents_kernel(fR, fU, out):  # pragma: no cover - JIT経路
+        for i in prange(fR.shape[0]):
+            a = fR[i]
+            b = fU[i]
+            if a > 0 and b > 0 and a == a and b == b:  # NaN は自分自身と不一致
+                out[i] = 1200.0 * np.log2(b / a)
+            else:
+                out[i] = np.nan
+else:
+    _cents_kernel = None
+
+
+def cents_diff(f_ref, f_usr):
+    """2 系列の f0 差をセント単位に変換する。NaN や無声区間はそのまま欠損として扱う。"""
+    if _cents_kernel is not None:
+        out = np.empty(len(f_ref), dtype=np.float64)
+        _cents_kernel(np.ascontiguousarray(f_ref, dtype=np.float64),
+                      np.ascontiguousarray(f_usr, dtype=np.float64), out)
+        return out
+    diff = np.full_like(f_ref, np.nan, dtype=float)
+    # 無声（0 以下）や欠損を除いた部分だけを対象にする
+    mask = (~np.isnan(f_ref)) & (~np.isnan(f_usr)) & (f_ref>0) & (f_usr>0)
+    diff[mask] = 1200.0*np.log2(f_usr[mask]/f_ref[mask])
+    return diff
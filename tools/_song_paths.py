@@ -1,10 +1,12 @@
 # SingingApp/tools/_song_paths.py
+from functools import lru_cache
 from pathlib import Path
 
 def get_song_id(default="sample01"):
     import os
     return os.environ.get("SONG", default).strip() or default
 
+@lru_cache(maxsize=64)
 def paths(song: str):
     """
     返す辞書:
@@ -13,6 +15,9 @@ def paths(song: str):
       user:   ユーザーデータ置き場
       export: アプリへ渡す最終成果物
       files:  主に歌詞とピッチの標準ファイルパス
+
+    resolve() などの syscall を毎回払わないよう song ごとにキャッシュする
+    （純粋なパス計算のみ。ディレクトリ作成は ensure_dirs() で行う）。
     """
     ROOT = Path(__file__).resolve().parents[1]            # …/SingingTrainerApp/SingingApp
     ANA  = ROOT / "SingingApp" / "analysis"
@@ -38,9 +43,6 @@ def paths(song: str):
             "ref_lyrics":       ref / "lyrics.json",
         }
 
-    for d in (ref, user, export):
-        d.mkdir(parents=True, exist_ok=True)
-
     return {
         "ROOT": ROOT, "ANA": ANA,
         "base": base, "ref": ref, "user": user, "export": export,
@@ -48,3 +50,10 @@ def paths(song: str):
         # 互換用の大文字キー（00_scaffold_song.py 向け）
         "BASE": base, "REF": ref, "USER": user, "EXPORT": export,
     }
+
+def ensure_dirs(song: str):
+    """ref/user/export を作って paths(song) を返す（起動時に1回呼べばよい）。"""
+    p = paths(song)
+    for d in (p["ref"], p["user"], p["export"]):
+        d.mkdir(parents=True, exist_ok=True)
+    return p
@@ -0,0 +1,78 @@
+# tools/batch_plot.py
+# 04（比較プロット）だけを複数ユーザー分まとめて描くバッチランナー。
+# matplotlib はスレッドセーフではないので、並列化はプロセス単位で行う。
+# ワーカーごとに 04 のモジュール（と使い回しの Figure）を1回だけ用意し、
+# savefig を含む描画全体をメインプロセスの外に追い出す。
+#
+# 使い方:
+#   python tools/batch_plot.py user01 user02 user03
+#   python tools/batch_plot.py --singlecore user01   # デバッグ用に逐次実行
+
+import argparse
+import importlib.util
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# run_pipeline と同じく、プロセス並列と BLAS/OpenMP の内部並列が
+# 掛け算でコアを取り合わないようワーカーは1スレッドに固定
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+TOOLS_DIR = Path(__file__).resolve().parent
+ANALYSIS_DIR = Path(os.environ.get("ANALYSIS_DIR", "SingingApp/analysis"))
+REF_JSON = os.environ.get("REF_JSON", str(ANALYSIS_DIR / "sample01" / "pitch.json"))
+
+# ワーカープロセス内でロード済みの 04 モジュール（Figure ごと使い回す）
+_plot_mod = None
+
+
+def _plot_compare():
+    global _plot_mod
+    if _plot_mod is None:
+        # 先頭が数字のファイル名なので通常 import ではなく spec 経由で読む
+        spec = importlib.util.spec_from_file_location(
+            "plot_compare", TOOLS_DIR / "04_plot_compare.py")
+        _plot_mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_plot_mod)
+    return _plot_mod
+
+
+def render_user(user_id: str) -> str:
+    base = ANALYSIS_DIR / user_id
+    _plot_compare().render(
+        REF_JSON,
+        str(base / "pitch.json"),
+        str(base / "events.json"),
+        str(base / "compare.png"),
+    )
+    return user_id
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("user_ids", nargs="+")
+    ap.add_argument("--singlecore", action="store_true",
+                    help="プールを作らず逐次描画する（デバッグ用）")
+    args = ap.parse_args()
+
+    if args.singlecore or len(args.user_ids) == 1:
+        jobs = [(REF_JSON,
+                 str(ANALYSIS_DIR / uid / "pitch.json"),
+                 str(ANALYSIS_DIR / uid / "events.json"),
+                 str(ANALYSIS_DIR / uid / "compare.png"))
+                for uid in args.user_ids]
+        _plot_compare().render_many(jobs)
+        for uid in args.user_ids:
+            print("done:", uid)
+        return
+
+    workers = min(len(args.user_ids), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for uid in ex.map(render_user, args.user_ids):
+            print("done:", uid)
+
+
+if __name__ == "__main__":
+    main()
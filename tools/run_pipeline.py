@@ -0,0 +1,89 @@
+# tools/run_pipeline.py
+# 01（ピッチ抽出）→02（比較イベント）→03（コメント）→04（プロット）を
+# ユーザーごとに直列実行し、ユーザー間はプロセス並列で回すドライバ。
+#
+# 使い方:
+#   python tools/run_pipeline.py user01 user02 user03
+#
+# 前提レイアウト（ANALYSIS_DIR で上書き可能）:
+#   SingingApp/analysis/<user>/input.wav   … 録音（01 の入力）
+#   SingingApp/analysis/<user>/pitch.json  … 01 の出力
+#   以降のイベント/コメント/PNG も同じディレクトリに出る
+#
+# 各ステージは環境変数でパスを受け取るスクリプトなので、ワーカー内で
+# ステージごとに環境を差し替えて runpy で実行する（subprocess 起動より
+# Python/numpy の import を使い回せる分だけ速い）。
+
+import os
+import sys
+import runpy
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# librosa/numpy が内部スレッド並列まで使うと、プロセス並列と掛け算で
+# コア数を超えて取り合いになる。ワーカーの BLAS/OpenMP は1スレッドに固定
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+TOOLS_DIR = Path(__file__).resolve().parent
+ANALYSIS_DIR = Path(os.environ.get("ANALYSIS_DIR", "SingingApp/analysis"))
+REF_JSON = os.environ.get("REF_JSON", str(ANALYSIS_DIR / "sample01" / "pitch.json"))
+
+
+def _run_stage(script: str, env: dict) -> None:
+    """ステージスクリプト 1 本を、環境変数を差し替えてこのプロセス内で実行する。"""
+    os.environ.update(env)
+    path = str(TOOLS_DIR / script)
+    # ドライバ自身の argv（ユーザーID列）をステージに見せない。04 のように
+    # argparse を持つステージが「unrecognized arguments」で落ちないよう、
+    # スクリプト名だけの argv に差し替えて実行し、終わったら戻す
+    argv_bak = sys.argv
+    sys.argv = [path]
+    try:
+        runpy.run_path(path, run_name="__main__")
+    finally:
+        sys.argv = argv_bak
+
+
+def run_one(user_id: str) -> str:
+    base = ANALYSIS_DIR / user_id
+    pitch = str(base / "pitch.json")
+    events = str(base / "events.json")
+
+    _run_stage("01_user_pitch_extract_json.py", {
+        "IN_WAV": str(base / "input.wav"),
+        "OUT_JSON": pitch,
+    })
+    _run_stage("02_compare_with_reference.py", {
+        "REF_JSON": REF_JSON,
+        "USR_JSON": pitch,
+        "OUT_JSON": events,
+    })
+    _run_stage("03_render_comments_txt.py", {
+        "IN_EVENTS": events,
+        "OUT_TXT": str(base / "comments.txt"),
+    })
+    _run_stage("04_plot_compare.py", {
+        "REF_JSON": REF_JSON,
+        "USR_JSON": pitch,
+        "EVT_JSON": events,
+        "OUT_PNG": str(base / "compare.png"),
+    })
+    return user_id
+
+
+def main() -> None:
+    user_ids = sys.argv[1:]
+    if not user_ids:
+        raise SystemExit("usage: python tools/run_pipeline.py <user_id> [<user_id> ...]")
+
+    # ユーザー単位は完全に独立なので素直なプロセス並列で回せる
+    workers = min(len(user_ids), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for uid in ex.map(run_one, user_ids):
+            print("done:", uid)
+
+
+if __name__ == "__main__":
+    main()